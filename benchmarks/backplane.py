@@ -0,0 +1,124 @@
+"""Cross-process fan-out through UnixSocketHub: latency and throughput.
+
+One publisher process broadcasts messages in bursts, every subscriber
+process reports delivery latency and the rate it received messages at.
+
+Usage: python benchmarks/backplane.py [--subscribers 4] [--messages 100000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sockjs.backplane import UnixSocketBackplane, UnixSocketHub
+from sockjs.protocol import dumps, loads, message_frame
+
+
+class Manager:
+    """Stands for a session manager, records delivered frames."""
+
+    name = 'bench'
+
+    def __init__(self, loop, total=0):
+        self.loop = loop
+        self.total = total
+        self.latencies = []
+        self.started = None
+        self.done = asyncio.Future(loop=loop)
+
+    def _deliver(self, channel, frame):
+        now = time.time()
+        if self.started is None:
+            self.started = now
+
+        sent = loads(loads(frame[1:])[0])
+        self.latencies.append(now - sent)
+        if len(self.latencies) == self.total:
+            self.done.set_result(now - self.started)
+
+
+def hub(path, ready):
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(UnixSocketHub(path, loop=loop).start())
+    ready.set()
+    loop.run_forever()
+
+
+def subscriber(path, total, results):
+    loop = asyncio.new_event_loop()
+    manager = Manager(loop, total)
+    backplane = UnixSocketBackplane(path, loop=loop)
+    backplane.register(manager)
+
+    elapsed = loop.run_until_complete(
+        asyncio.wait_for(manager.done, 60, loop=loop))
+    backplane.unregister(manager)
+    loop.run_until_complete(asyncio.sleep(0, loop=loop))
+
+    latencies = sorted(manager.latencies)
+    results.put((total / elapsed,
+                 latencies[len(latencies) // 2],
+                 latencies[int(len(latencies) * 0.99)]))
+
+
+@asyncio.coroutine
+def publish(loop, backplane, manager, count, burst):
+    while not backplane.connected:
+        yield from asyncio.sleep(0.01, loop=loop)
+    # let subscribers connect
+    yield from asyncio.sleep(1.0, loop=loop)
+
+    for idx in range(0, count, burst):
+        for _ in range(min(burst, count - idx)):
+            backplane.publish(
+                manager, None, message_frame(dumps(time.time())))
+        yield from asyncio.sleep(0, loop=loop)
+
+    yield from asyncio.sleep(0.5, loop=loop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--burst', type=int, default=100,
+                        help='messages published per loop iteration')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'hub.sock')
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+
+    processes = [multiprocessing.Process(target=hub, args=(path, ready))]
+    processes[0].start()
+    ready.wait()
+
+    for idx in range(args.subscribers):
+        process = multiprocessing.Process(
+            target=subscriber, args=(path, args.messages, results))
+        process.start()
+        processes.append(process)
+
+    loop = asyncio.new_event_loop()
+    manager = Manager(loop)
+    backplane = UnixSocketBackplane(path, loop=loop)
+    backplane.register(manager)
+    loop.run_until_complete(
+        publish(loop, backplane, manager, args.messages, args.burst))
+
+    for idx in range(args.subscribers):
+        rate, p50, p99 = results.get(timeout=60)
+        print('subscriber %d: %9.0f msg/s  p50 %6.2fms  p99 %6.2fms' % (
+            idx, rate, p50 * 1000, p99 * 1000))
+    print('dropped by publisher: %d' % backplane.dropped)
+
+    backplane.unregister(manager)
+    loop.run_until_complete(asyncio.sleep(0, loop=loop))
+    for process in processes:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
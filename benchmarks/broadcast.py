@@ -0,0 +1,120 @@
+"""Broadcast latency with per-session waiters vs session sinks.
+
+Time from ``SessionManager.broadcast()`` until every session wrote the
+frame. ``waiter`` runs one task per session blocked in
+``Session._wait()``, as transports did before sinks, ``sink`` registers
+a sink per session that manager flushes in one pass.
+
+Usage: python benchmarks/broadcast.py [--sessions 10000 50000]
+"""
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from sockjs import SessionManager
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+class Writer:
+    """Counts written frames, stands for a connection."""
+
+    def __init__(self, count, loop):
+        self.count = count
+        self.loop = loop
+        self.reset()
+
+    def reset(self):
+        self.pending = self.count
+        self.done = asyncio.Future(loop=self.loop)
+        self.first = None
+
+    def write(self, text):
+        self.pending -= 1
+        if self.first is None:
+            self.first = time.perf_counter()
+        if not self.pending:
+            self.done.set_result(time.perf_counter())
+
+
+class Sink:
+    direct = False
+
+    def __init__(self, manager, writer):
+        self.manager = manager
+        self.writer = writer
+
+    def flush(self, session):
+        while session._queue:
+            frame, text = session._take()
+            self.writer.write(text)
+
+
+@asyncio.coroutine
+def wait_loop(session, writer):
+    while True:
+        frame, text = yield from session._wait()
+        writer.write(text)
+
+
+@asyncio.coroutine
+def run(loop, count, mode, rounds):
+    app = web.Application(loop=loop)
+    manager = SessionManager('bench', app, handler, loop)
+    writer = Writer(count, loop)
+
+    tasks = []
+    for idx in range(count):
+        session = manager.get(str(idx), True)
+        yield from manager.acquire(session)
+        if mode == 'sink':
+            session._sink = sink = Sink(manager, writer)
+            sink.flush(session)  # open frame
+        else:
+            tasks.append(ensure_future(wait_loop(session, writer), loop=loop))
+    yield from asyncio.sleep(0, loop=loop)
+
+    first, last = [], []
+    for _ in range(rounds):
+        writer.reset()
+        started = time.perf_counter()
+        manager.broadcast('x' * 32)
+        finished = yield from writer.done
+        first.append(writer.first - started)
+        last.append(finished - started)
+
+    for task in tasks:
+        task.cancel()
+    yield from asyncio.sleep(0, loop=loop)
+    manager.stop()
+    return min(first), min(last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+',
+                        default=[10000, 50000])
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for count in args.sessions:
+        for mode in ('waiter', 'sink'):
+            first, last = loop.run_until_complete(
+                run(loop, count, mode, args.rounds))
+            print('%6d sessions %-6s first %7.2fms  all %7.2fms' % (
+                count, mode, first * 1e3, last * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Compare session GC pass: linear scan vs expiry wheel.
+
+``--acquired`` sessions are attached to a transport and idle, they
+outlive their timeout and are never collected.
+
+Usage: python benchmarks/expiry.py [--expired 0.05] [--acquired 0.5]
+                                   [10000 100000 ...]
+"""
+import argparse
+import asyncio
+import time
+
+from sockjs import Session, SessionManager
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+def scan(manager, sessions):
+    """GC pass as it was implemented before the expiry wheel."""
+    now = manager._clock.time()
+
+    idx = 0
+    while idx < len(sessions):
+        session = sessions[idx]
+
+        if session.acquired:
+            session._heartbeat()
+
+        elif session.expires < now:
+            del manager[session.id]
+            del sessions[idx]
+            continue
+
+        idx += 1
+
+
+def populate(loop, manager, count, expired, acquired):
+    sessions = []
+    step = int(1 / expired) if expired else 0
+    acquired = int(count * acquired)
+
+    for idx in range(count):
+        session = manager._add(
+            Session(str(idx), handler,
+                    timeout=manager.timeout, loop=manager.loop))
+        if idx < acquired:
+            loop.run_until_complete(manager.acquire(session))
+            session._tick(-30.0)
+        elif step and not idx % step:
+            session._tick(-30.0)
+        sessions.append(session)
+
+    return sessions
+
+
+def run(loop, count, expired, acquired):
+    manager = SessionManager('bench', None, handler, loop)
+    sessions = populate(loop, manager, count, expired, acquired)
+    start = time.perf_counter()
+    scan(manager, sessions)
+    scanned = time.perf_counter() - start
+
+    manager = SessionManager('bench', None, handler, loop)
+    populate(loop, manager, count, expired, acquired)
+    start = time.perf_counter()
+    loop.run_until_complete(manager._gc_task())
+    wheel = time.perf_counter() - start
+    manager.stop()
+
+    print('%9d sessions: scan %9.2fms  wheel %9.2fms' % (
+        count, scanned * 1000, wheel * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expired', type=float, default=0.05,
+                        help='fraction of expired sessions per pass')
+    parser.add_argument('--acquired', type=float, default=0.5,
+                        help='fraction of idle acquired sessions')
+    parser.add_argument('counts', type=int, nargs='*',
+                        default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for count in args.counts:
+        run(loop, count, args.expired, args.acquired)
+
+
+if __name__ == '__main__':
+    main()
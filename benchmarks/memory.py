@@ -0,0 +1,100 @@
+"""Memory used by idle sessions, measured with tracemalloc.
+
+``slots`` is current ``Session`` added by ``SessionManager``,
+``baseline`` is the session layout before ``__slots__``: attributes in
+instance ``__dict__``, eagerly allocated queue and ``datetime``
+deadline, added to a manager that also kept a list of sessions.
+
+Usage: python benchmarks/memory.py [--sessions 100000]
+"""
+import argparse
+import asyncio
+import collections
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sockjs import SessionManager
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+class BaselineSession:
+    """Session attributes as they were set before ``__slots__``."""
+
+    manager = None
+    acquired = False
+    state = 0
+    interrupted = False
+    exception = None
+
+    def __init__(self, id, handler, *,
+                 timeout=timedelta(seconds=10), loop=None, debug=False):
+        self.id = id
+        self.handler = handler
+        self.expired = False
+        self.timeout = timeout
+        self.expires = datetime.now() + timeout
+        self.loop = loop
+
+        self._hits = 0
+        self._heartbeats = 0
+        self._heartbeat_transport = False
+        self._debug = debug
+        self._waiter = None
+        self._queue = collections.deque()
+
+
+def add_slots(loop, ids):
+    manager = SessionManager('bench', None, handler, loop)
+    for sid in ids:
+        manager.get(sid, create=True)
+    return manager
+
+
+def add_baseline(loop, ids):
+    manager, sessions = {}, []
+    timeout = timedelta(seconds=5)
+    for sid in ids:
+        session = BaselineSession(sid, handler, timeout=timeout, loop=loop)
+        session.manager = manager
+        session.registry = None
+        manager[sid] = session
+        sessions.append(session)
+    return manager, sessions
+
+
+def measure(loop, add, count):
+    ids = [str(idx) for idx in range(count)]
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+
+    sessions = add(loop, ids)
+
+    gc.collect()
+    stop = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del sessions
+
+    size = sum(stat.size_diff for stat in stop.compare_to(start, 'filename'))
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100000)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, add in (('baseline', add_baseline), ('slots', add_slots)):
+        size = measure(loop, add, args.sessions)
+        print('%-9s %7.1f bytes per idle session' % (name, size))
+
+
+if __name__ == '__main__':
+    main()
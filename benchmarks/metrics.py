@@ -0,0 +1,99 @@
+"""Overhead of SessionManager(metrics=True).
+
+``memory``: one incoming message, an echo reply from handler and one
+``Session._wait()`` that takes the reply from the queue, no I/O. This
+is the worst case, metrics hooks are the only extra work.
+
+``http``: the same echo through ``xhr_send`` and ``xhr`` requests
+to a local server.
+
+Usage: python benchmarks/metrics.py [--messages 200000] [--requests 2000]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+
+import sockjs
+from sockjs import SessionManager, MSG_MESSAGE
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    if msg.tp == MSG_MESSAGE:
+        session.send(msg.data)
+
+
+@asyncio.coroutine
+def roundtrips(session, count):
+    for idx in range(count):
+        yield from session._remote_message('message')
+        yield from session._wait()
+
+
+def measure_memory(loop, metrics, count):
+    manager = SessionManager('bench', None, handler, loop, metrics=metrics)
+    session = manager.get('bench', create=True)
+    loop.run_until_complete(manager.acquire(session))
+    loop.run_until_complete(session._wait())  # open frame
+
+    started = time.perf_counter()
+    loop.run_until_complete(roundtrips(session, count))
+    return count / (time.perf_counter() - started)
+
+
+@asyncio.coroutine
+def requests(loop, metrics, count):
+    app = web.Application(loop=loop)
+    sockjs.add_endpoint(app, handler, name='bench', metrics=metrics)
+    server = yield from loop.create_server(
+        app.make_handler(), '127.0.0.1', 0, family=socket.AF_INET)
+    port = server.sockets[0].getsockname()[1]
+
+    client = aiohttp.ClientSession(loop=loop)
+    url = 'http://127.0.0.1:%d/sockjs/000/%s/' % (port, metrics)
+    resp = yield from client.post(url + 'xhr')
+    yield from resp.read()
+
+    started = time.perf_counter()
+    for idx in range(count):
+        resp = yield from client.post(url + 'xhr_send', data='["message"]')
+        yield from resp.read()
+        resp = yield from client.post(url + 'xhr')
+        yield from resp.read()
+    elapsed = time.perf_counter() - started
+
+    client.close()
+    server.close()
+    sockjs.get_manager('bench', app).stop()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+
+    def http(loop, metrics, count):
+        return loop.run_until_complete(requests(loop, metrics, count))
+
+    for name, measure, count in (('memory', measure_memory, args.messages),
+                                 ('http', http, args.requests)):
+        # interleave runs so both see the same machine noise
+        off = on = 0
+        for _ in range(args.repeat):
+            off = max(off, measure(loop, False, count))
+            on = max(on, measure(loop, True, count))
+        print('%-6s metrics off %9.0f/s, on %9.0f/s, overhead %5.1f%%' % (
+            name, off, on, (off - on) / off * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Polling round trips needed to deliver N broadcasts to one session.
+
+Every ``Session._wait()`` call is one xhr poll, since ``XHRTransport``
+ends the response after the first frame.
+
+Usage: python benchmarks/polling.py [1 10 50 ...]
+"""
+import argparse
+import asyncio
+
+from sockjs import SessionManager, STATE_OPEN
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+@asyncio.coroutine
+def polls(manager, session, count, pack):
+    for idx in range(count):
+        manager.broadcast('message %d' % idx)
+        session.send('reply %d' % idx)
+
+    result = 0
+    while session._queue:
+        yield from session._wait(pack=pack)
+        result += 1
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('counts', type=int, nargs='*',
+                        default=[1, 10, 50, 500])
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    manager = SessionManager('bench', None, handler, loop)
+    session = manager.get('bench', create=True)
+    session.state = STATE_OPEN
+
+    for count in args.counts:
+        # unpacked entries are what polls used to return one by one
+        before = loop.run_until_complete(
+            polls(manager, session, count, False))
+        after = loop.run_until_complete(
+            polls(manager, session, count, True))
+        print('%5d broadcasts: %5d polls before, %d after' % (
+            count, before, after))
+
+
+if __name__ == '__main__':
+    main()
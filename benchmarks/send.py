@@ -0,0 +1,62 @@
+"""Micro-benchmark of Session.send: datetime deadlines vs coarse clock.
+
+Usage: python benchmarks/send.py [--number 1000000]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sockjs import Session, STATE_OPEN
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+class DatetimeSession(Session):
+    """Session with wall clock deadlines, as it was before the clock."""
+
+    def _tick(self, timeout=None):
+        self.expired = False
+
+        if timeout is None:
+            self.expires = datetime.now() + timedelta(seconds=self.timeout)
+        else:
+            self.expires = datetime.now() + timedelta(seconds=timeout)
+
+
+def measure(session, number):
+    session.state = STATE_OPEN
+    send = session.send
+
+    start = time.perf_counter()
+    for idx in range(number):
+        send('message')
+        if not idx % 1000:
+            session._queue = ()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=1000000)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    before = DatetimeSession('before', handler, loop=loop)
+    after = Session('after', handler, loop=loop)
+
+    after._clock.start()
+    try:
+        for name, session in (('datetime', before), ('clock', after)):
+            elapsed = measure(session, args.number)
+            print('%-9s %8.1f ns/send' % (
+                name, elapsed / args.number * 10**9))
+    finally:
+        after._clock.stop()
+
+
+if __name__ == '__main__':
+    main()
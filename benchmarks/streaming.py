@@ -0,0 +1,96 @@
+"""Frames per second of xhr_streaming transport.
+
+Server queues ``--burst`` frames at a time on one session, the client
+reads the stream until all frames arrive. ``messages`` frames are merged
+into one ``a[...]`` frame by the session queue, ``mixed`` alternates
+messages with heartbeats, so every queued frame is written separately.
+
+Usage: python benchmarks/streaming.py [--frames 200000] [--burst 100]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+
+import sockjs
+from sockjs.protocol import FRAME_HEARTBEAT
+from sockjs.transports.xhrstreaming import XHRStreamingTransport
+
+# one response for the whole run
+XHRStreamingTransport.maxsize = 1 << 40
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+@asyncio.coroutine
+def produce(session, frames, burst, mixed):
+    for idx in range(0, frames, burst):
+        for _ in range(burst // 2 if mixed else burst):
+            session.send('x' * 32)
+            if mixed:
+                session._feed(FRAME_HEARTBEAT, FRAME_HEARTBEAT)
+        yield from asyncio.sleep(0)
+
+
+@asyncio.coroutine
+def consume(resp, expected):
+    lines = 0
+    while lines < expected:
+        chunk = yield from resp.content.readany()
+        lines += chunk.count(b'\n')
+
+
+@asyncio.coroutine
+def run(loop, frames, burst, mixed):
+    app = web.Application(loop=loop)
+    sockjs.add_endpoint(app, handler, name='bench')
+    manager = sockjs.get_manager('bench', app)
+    server = yield from loop.create_server(
+        app.make_handler(), '127.0.0.1', 0, family=socket.AF_INET)
+    port = server.sockets[0].getsockname()[1]
+
+    client = aiohttp.ClientSession(loop=loop)
+    url = 'http://127.0.0.1:%d/sockjs/000/bench/xhr_streaming' % port
+    resp = yield from client.post(url)
+    yield from resp.content.readline()  # prelude
+    yield from resp.content.readline()  # open frame
+
+    session = manager['bench']
+    expected = frames if mixed else frames // burst
+    started = time.perf_counter()
+    yield from asyncio.gather(
+        produce(session, frames, burst, mixed),
+        consume(resp, expected), loop=loop)
+    elapsed = time.perf_counter() - started
+
+    resp.close()
+    client.close()
+    server.close()
+    manager.stop()
+    return frames / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200000)
+    parser.add_argument('--burst', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, mixed in (('messages', False), ('mixed', True)):
+        best = max(
+            loop.run_until_complete(
+                run(loop, args.frames, args.burst, mixed))
+            for _ in range(args.repeat))
+        print('%-8s burst %4d: %10.0f frames/s' % (name, args.burst, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Send-to-wire latency of websocket transport.
+
+Time from ``session.send()`` on the server to the frame arriving at
+a client on the same event loop, with direct writes of idle sessions
+(``WebSocketTransport.direct``) on and off.
+
+Usage: python benchmarks/websocket.py [--messages 20000]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+
+import sockjs
+from sockjs.transports import WebSocketTransport
+
+
+@asyncio.coroutine
+def handler(msg, session):
+    pass
+
+
+@asyncio.coroutine
+def run(loop, count, direct):
+    WebSocketTransport.direct = direct
+
+    app = web.Application(loop=loop)
+    sockjs.add_endpoint(app, handler, name='bench')
+    manager = sockjs.get_manager('bench', app)
+    server = yield from loop.create_server(
+        app.make_handler(), '127.0.0.1', 0, family=socket.AF_INET)
+    port = server.sockets[0].getsockname()[1]
+
+    client = aiohttp.ClientSession(loop=loop)
+    ws = yield from client.ws_connect(
+        'http://127.0.0.1:%d/sockjs/000/bench/websocket' % port)
+    yield from ws.receive()  # open frame
+    session = manager['bench']
+
+    latencies = []
+    for idx in range(count):
+        started = time.perf_counter()
+        session.send('x' * 32)
+        yield from ws.receive()
+        latencies.append(time.perf_counter() - started)
+
+    yield from ws.close()
+    client.close()
+    server.close()
+    manager.stop()
+
+    latencies.sort()
+    return (latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)],
+            count / sum(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for _ in range(args.repeat):
+        for direct in (False, True):
+            p50, p99, rate = loop.run_until_complete(
+                run(loop, args.messages, direct))
+            print('direct %-5s p50 %6.1fus  p99 %6.1fus  %8.0f msg/s' % (
+                direct, p50 * 1e6, p99 * 1e6, rate))
+
+
+if __name__ == '__main__':
+    main()
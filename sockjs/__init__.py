@@ -6,16 +6,23 @@ from sockjs.session import Session
 from sockjs.session import SessionManager
 from sockjs.exceptions import SessionIsClosed
 from sockjs.exceptions import SessionIsAcquired
+from sockjs.exceptions import SessionIsRemote
+from sockjs.exceptions import SessionRejected
 
 from sockjs.protocol import STATE_NEW
 from sockjs.protocol import STATE_OPEN
 from sockjs.protocol import STATE_CLOSING
 from sockjs.protocol import STATE_CLOSED
 
+from sockjs.protocol import OVERFLOW_DROP_OLDEST
+from sockjs.protocol import OVERFLOW_DROP_NEWEST
+from sockjs.protocol import OVERFLOW_CLOSE
+
 from sockjs.protocol import MSG_OPEN
 from sockjs.protocol import MSG_MESSAGE
 from sockjs.protocol import MSG_CLOSE
 from sockjs.protocol import MSG_CLOSED
+from sockjs.protocol import MSG_MESSAGES
 
 from sockjs.route import get_manager, add_endpoint
 
@@ -25,6 +32,8 @@ __version__ = '0.5.0'
 
 __all__ = (
     'get_manager', 'add_endpoint', 'Session', 'SessionManager',
-    'SessionIsClosed', 'SessionIsAcquired',
+    'SessionIsClosed', 'SessionIsAcquired', 'SessionIsRemote',
+    'SessionRejected',
     'STATE_NEW', 'STATE_OPEN', 'STATE_CLOSING', 'STATE_CLOSED',
-    'MSG_OPEN', 'MSG_MESSAGE', 'MSG_CLOSE', 'MSG_CLOSED',)
+    'OVERFLOW_DROP_OLDEST', 'OVERFLOW_DROP_NEWEST', 'OVERFLOW_CLOSE',
+    'MSG_OPEN', 'MSG_MESSAGE', 'MSG_CLOSE', 'MSG_CLOSED', 'MSG_MESSAGES',)
@@ -0,0 +1,105 @@
+"""Session admission control
+
+``SessionManager(admission=...)`` checks caps before a new session is
+created, rejected requests get ``503`` response built from prepared
+body and headers, no session is created and handler is not called.
+"""
+import collections
+
+from aiohttp import hdrs, web
+
+from .exceptions import SessionRejected
+from .store import FORWARDED, FORWARDED_FOR, peer_host
+
+REJECT_BODY = b'Server is busy, try again later.\n'
+
+
+class Admission:
+    """Caps for new sessions of one session manager, ``0`` disables
+    a cap.
+
+    ``max_sessions``: Number of sessions in manager.
+
+    ``rate``, ``burst``: New sessions per second, token bucket holds
+    ``burst`` tokens, ``rate`` but at least one by default.
+
+    ``max_per_client``: Sessions per client address, see ``client()``.
+
+    ``retry_after``: Seconds in ``Retry-After`` header of rejection.
+
+    """
+
+    def __init__(self, max_sessions=0, rate=0.0, burst=None,
+                 max_per_client=0, retry_after=5):
+        self.max_sessions = max_sessions
+        self.rate = float(rate)
+        self.burst = float(max(1.0, rate) if burst is None else burst)
+        self.max_per_client = max_per_client
+        self.headers = (
+            (hdrs.CONTENT_TYPE, 'text/plain; charset=UTF-8'),
+            (hdrs.CACHE_CONTROL, 'no-store, no-cache'),
+            (hdrs.RETRY_AFTER, str(retry_after)))
+        self.rejected = collections.Counter()
+
+        self._tokens = self.burst
+        self._updated = None
+        self._clients = collections.Counter()
+        self._client_of = {}
+
+    def client(self, request):
+        """Client address of request, override to trust proxy headers.
+        Requests proxied by ``UnixSocketStore`` come from a unix socket
+        and carry address of the original client."""
+        host = peer_host(request)
+        if not host and FORWARDED in request.headers:
+            return request.headers.get(FORWARDED_FOR, host)
+        return host
+
+    def check(self, manager, request, now):
+        """Raise ``SessionRejected`` if new session is over a cap,
+        return client address for ``opened()``."""
+        if self.max_sessions and len(manager) >= self.max_sessions:
+            self._reject('sessions')
+
+        client = None
+        if self.max_per_client and request is not None:
+            client = self.client(request)
+            if self._clients[client] >= self.max_per_client:
+                self._reject('client')
+
+        if self.rate:
+            if self._updated is not None:
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1.0:
+                self._reject('rate')
+            self._tokens -= 1.0
+
+        return client
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        raise SessionRejected(reason)
+
+    def opened(self, session, client):
+        if client is not None:
+            self._clients[client] += 1
+            self._client_of[session.id] = client
+
+    def closed(self, session):
+        client = self._client_of.pop(session.id, None)
+        if client is not None:
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+
+    def clear(self):
+        self._clients.clear()
+        self._client_of.clear()
+
+    def response(self):
+        """Rejection response, new object for every request."""
+        return web.Response(
+            status=503, body=REJECT_BODY, headers=self.headers)
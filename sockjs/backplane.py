@@ -0,0 +1,233 @@
+"""Broadcast backplanes
+
+Backplane delivers broadcasts and channel messages of a session manager
+to managers with the same name in other processes.
+"""
+import asyncio
+import logging
+import os
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
+
+from .protocol import dumps, loads, ENCODING
+
+
+log = logging.getLogger('sockjs')
+
+HUB_LINE_LIMIT = 16*1024*1024  # max size of one batch
+
+
+class Backplane:
+    """Base backplane.
+
+    Messages published during one event loop iteration are sent as
+    one batch with ``send()``, subclasses pass received messages
+    to ``deliver()``.
+
+    """
+
+    def __init__(self, *, loop=None):
+        self.loop = loop
+        self._managers = {}
+        self._pending = []
+        self._handle = None
+
+    def register(self, manager):
+        if self.loop is None:
+            self.loop = manager.loop
+
+        start = not self._managers
+        managers = self._managers.setdefault(manager.name, [])
+        if not any(item is manager for item in managers):
+            managers.append(manager)
+
+        if start:
+            self.start()
+
+    def unregister(self, manager):
+        managers = self._managers.get(manager.name, [])
+        managers[:] = [item for item in managers if item is not manager]
+        if not managers:
+            self._managers.pop(manager.name, None)
+
+        if not self._managers:
+            self.stop()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._pending = []
+
+    def publish(self, manager, channel, frame):
+        """Queue message frame, ``channel`` is None for broadcasts."""
+        self._pending.append((manager, channel, frame))
+        if self._handle is None:
+            self._handle = self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.send(batch)
+
+    def send(self, batch):
+        raise NotImplementedError
+
+    def deliver(self, name, channel, frame, origin=None):
+        for manager in self._managers.get(name, ()):
+            if manager is not origin:
+                manager._deliver(channel, frame)
+
+
+class LocalBackplane(Backplane):
+    """In-process backplane, connects all managers registered
+    with the same backplane instance."""
+
+    def send(self, batch):
+        for manager, channel, frame in batch:
+            self.deliver(manager.name, channel, frame, origin=manager)
+
+
+class UnixSocketBackplane(Backplane):
+    """Backplane connected to ``UnixSocketHub`` listening on ``path``.
+
+    Batches are written without waiting, batches are dropped while
+    hub is not connected or while more than ``max_buffer`` bytes wait
+    in the socket buffer.
+
+    """
+
+    def __init__(self, path, *, loop=None,
+                 reconnect=1.0, max_buffer=4*1024*1024):
+        super().__init__(loop=loop)
+        self.path = path
+        self.reconnect = reconnect
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._writer = None
+        self._task = None
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = ensure_future(self._reader(), loop=self.loop)
+
+    def stop(self):
+        super().stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def send(self, batch):
+        writer = self._writer
+        if (writer is None or
+                writer.transport.get_write_buffer_size() > self.max_buffer):
+            self.dropped += len(batch)
+            return
+
+        data = dumps([[manager.name, channel, frame]
+                      for manager, channel, frame in batch])
+        writer.write(data.encode(ENCODING) + b'\n')
+
+    @asyncio.coroutine
+    def _reader(self):
+        while True:
+            try:
+                reader, self._writer = yield from asyncio.open_unix_connection(
+                    self.path, loop=self.loop, limit=HUB_LINE_LIMIT)
+            except OSError as exc:
+                log.warning('Can not connect to backplane hub: %s', exc)
+                yield from asyncio.sleep(self.reconnect, loop=self.loop)
+                continue
+
+            try:
+                while True:
+                    line = yield from reader.readline()
+                    if not line:
+                        break
+
+                    for name, channel, frame in loads(line.decode(ENCODING)):
+                        self.deliver(name, channel, frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('Exception in backplane reader.')
+
+            self._writer.close()
+            self._writer = None
+            yield from asyncio.sleep(self.reconnect, loop=self.loop)
+
+
+class UnixSocketHub:
+    """Relays batches between ``UnixSocketBackplane`` connections.
+
+    Every batch is written to all connections except the sender,
+    connections with more than ``max_buffer`` pending bytes skip
+    batches until they catch up.
+
+    """
+
+    def __init__(self, path, *, loop=None, max_buffer=16*1024*1024):
+        self.path = path
+        self.loop = loop
+        self.max_buffer = max_buffer
+        self.server = None
+        self._writers = set()
+
+    @asyncio.coroutine
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.server = yield from asyncio.start_unix_server(
+            self._handle, self.path, loop=self.loop, limit=HUB_LINE_LIMIT)
+
+    @asyncio.coroutine
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+            yield from self.server.wait_closed()
+            self.server = None
+
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    @asyncio.coroutine
+    def _handle(self, reader, writer):
+        writers = self._writers
+        writers.add(writer)
+        try:
+            while True:
+                line = yield from reader.readline()
+                if not line:
+                    break
+
+                for other in writers:
+                    if (other is not writer and
+                            other.transport.get_write_buffer_size() <=
+                            self.max_buffer):
+                        other.write(line)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception('Exception in backplane hub.')
+        finally:
+            writers.discard(writer)
+            writer.close()
@@ -0,0 +1,57 @@
+"""Coarse event loop clock"""
+import weakref
+
+
+_clocks = weakref.WeakKeyDictionary()
+
+
+def get_clock(loop):
+    """Return clock shared by all users of the event loop."""
+    clock = _clocks.get(loop)
+    if clock is None:
+        clock = _clocks[loop] = Clock(loop)
+    return clock
+
+
+class Clock:
+    """Coarse monotonic clock based on ``loop.time()``.
+
+    While clock is started the time is cached and refreshed every
+    ``resolution`` seconds, otherwise ``time()`` reads the loop time.
+
+    """
+
+    def __init__(self, loop, resolution=0.1):
+        self.loop = loop
+        self.resolution = resolution
+        self._now = None
+        self._users = 0
+        self._handle = None
+
+    @property
+    def started(self):
+        return self._handle is not None
+
+    def time(self):
+        now = self._now
+        if now is None:
+            return self.loop.time()
+        return now
+
+    def start(self):
+        self._users += 1
+        if self._handle is None:
+            self._update()
+
+    def stop(self):
+        if self._users:
+            self._users -= 1
+
+        if not self._users and self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._now = None
+
+    def _update(self):
+        self._now = self.loop.time()
+        self._handle = self.loop.call_later(self.resolution, self._update)
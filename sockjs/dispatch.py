@@ -0,0 +1,139 @@
+"""Concurrent dispatch of incoming messages"""
+import asyncio
+import logging
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
+
+from .protocol import MSG_MESSAGE, SockjsMessage
+
+log = logging.getLogger('sockjs')
+
+
+class _SessionState:
+
+    __slots__ = ('semaphore', 'chains', 'tasks', 'waiting')
+
+    def __init__(self, limit, loop):
+        self.semaphore = asyncio.Semaphore(limit, loop=loop)
+        self.chains = {}
+        self.tasks = set()
+        self.waiting = 0
+
+
+class Dispatcher:
+    """Runs message handlers of a session concurrently.
+
+    ``limit``: Handler calls running at once per session.
+
+    ``global_limit``: Handler calls running at once for all sessions
+    of the managers that use this dispatcher, ``0`` is unlimited.
+
+    ``ordering_key``: Callable, returns key for message text. Messages
+    with same key are handled one after another in order they arrived,
+    ``None`` key is not ordered. Without ``ordering_key`` all messages
+    are independent.
+
+    Message is accepted once a handler slot is free, so transport
+    stops reading session messages while all slots are busy.
+
+    """
+
+    def __init__(self, limit=4, global_limit=0, ordering_key=None, *,
+                 loop=None):
+        if limit < 1:
+            raise ValueError('limit must be positive')
+
+        self.limit = limit
+        self.global_limit = global_limit
+        self.ordering_key = ordering_key
+        self.loop = loop
+        self.running = 0
+        self._global = None
+        self._sessions = {}
+
+    @asyncio.coroutine
+    def dispatch(self, session, msg):
+        """Start handler for message, waits for free slots."""
+        loop = self.loop
+        if loop is None:
+            loop = self.loop = session.loop
+
+        state = self._sessions.get(session)
+        if state is None:
+            state = self._sessions[session] = _SessionState(self.limit, loop)
+
+        state.waiting += 1
+        try:
+            yield from state.semaphore.acquire()
+            if self.global_limit:
+                if self._global is None:
+                    self._global = asyncio.Semaphore(
+                        self.global_limit, loop=loop)
+                try:
+                    yield from self._global.acquire()
+                except:
+                    state.semaphore.release()
+                    raise
+        except:
+            state.waiting -= 1
+            self._cleanup(session, state)
+            raise
+        state.waiting -= 1
+
+        key = None
+        if self.ordering_key is not None:
+            try:
+                key = self.ordering_key(msg)
+            except:
+                log.exception('Exception in ordering key.')
+
+        previous = state.chains.get(key) if key is not None else None
+        task = ensure_future(
+            self._run(session, msg, state, key, previous), loop=loop)
+        state.tasks.add(task)
+        if key is not None:
+            state.chains[key] = task
+
+        self.running += 1
+
+    @asyncio.coroutine
+    def _run(self, session, msg, state, key, previous):
+        try:
+            if previous is not None:
+                yield from asyncio.wait((previous,), loop=self.loop)
+            message = SockjsMessage(MSG_MESSAGE, msg)
+            tracer = session._tracer
+            if tracer is None or not tracer.timing:
+                yield from session.handler(message, session)
+            else:
+                yield from session._traced(tracer, message)
+        except asyncio.CancelledError:
+            raise
+        except:
+            log.exception('Exceptin in message handler.')
+        finally:
+            self.running -= 1
+            state.semaphore.release()
+            if self.global_limit:
+                self._global.release()
+
+            task = asyncio.Task.current_task(loop=self.loop)
+            state.tasks.discard(task)
+            if key is not None and state.chains.get(key) is task:
+                del state.chains[key]
+            self._cleanup(session, state)
+
+    def _cleanup(self, session, state):
+        if (not state.tasks and not state.waiting and
+                self._sessions.get(session) is state):
+            del self._sessions[session]
+
+    @asyncio.coroutine
+    def join(self, session):
+        """Wait until running handlers of session are done."""
+        state = self._sessions.get(session)
+        if state is not None and state.tasks:
+            yield from asyncio.wait(list(state.tasks), loop=self.loop)
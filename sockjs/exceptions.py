@@ -11,3 +11,23 @@ class SessionIsAcquired(SockjsException):
 
 class SessionIsClosed(SockjsException):
     """Session is closed."""
+
+
+class SessionIsRemote(SockjsException):
+    """Session is owned by another worker process."""
+
+    def __init__(self, owner):
+        super().__init__(owner)
+        self.owner = owner
+
+
+class SlowConsumer(SockjsException):
+    """Client did not read its write buffer in time."""
+
+
+class SessionRejected(SockjsException):
+    """New session is over an admission cap."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
@@ -0,0 +1,70 @@
+"""Session expiry index"""
+import heapq
+
+
+class ExpiryWheel:
+    """Bucketed deadline index for sessions.
+
+    Sessions are grouped into buckets of ``resolution`` seconds by their
+    ``expires`` deadline. Moving a session to a new deadline is O(1),
+    collecting expired sessions only touches buckets that lie completely
+    in the past.
+
+    """
+
+    def __init__(self, resolution=1.0):
+        self.resolution = resolution
+        self._buckets = {}
+        self._keys = []  # heap of bucket keys
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def _key(self, session):
+        return int(session.expires // self.resolution)
+
+    def touch(self, session):
+        """Index session by its current deadline."""
+        key = self._key(session)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = set()
+            heapq.heappush(self._keys, key)
+        elif bucket is session._bucket:
+            return
+
+        if session._bucket is not None:
+            session._bucket.discard(session)
+
+        bucket.add(session)
+        session._bucket = bucket
+
+    def discard(self, session):
+        """Remove session from index."""
+        if session._bucket is not None:
+            session._bucket.discard(session)
+            session._bucket = None
+
+    def expired(self, now):
+        """Pop sessions from all buckets that ended before ``now``."""
+        limit = int(now // self.resolution)
+        keys = self._keys
+        buckets = self._buckets
+
+        result = []
+        while keys and keys[0] < limit:
+            bucket = buckets.pop(heapq.heappop(keys))
+            for session in bucket:
+                session._bucket = None
+            result.extend(bucket)
+
+        return result
+
+    def clear(self):
+        for bucket in self._buckets.values():
+            for session in bucket:
+                session._bucket = None
+
+        self._buckets.clear()
+        self._keys.clear()
@@ -0,0 +1,244 @@
+"""Session manager metrics
+
+Counters are plain attributes updated through tracer hooks, gauges
+are computed when metrics are collected.
+"""
+import bisect
+import collections
+import time
+
+from .protocol import STATE_NEW, STATE_OPEN, STATE_CLOSING, STATE_CLOSED
+from .protocol import FRAME_MESSAGE, FRAME_MESSAGE_BLOB, FRAME_HEARTBEAT
+from .threadpool import ThreadPoolHandler
+from .tracing import Tracer
+
+clock = time.perf_counter
+
+STATE_NAMES = {STATE_NEW: 'new', STATE_OPEN: 'open',
+               STATE_CLOSING: 'closing', STATE_CLOSED: 'closed'}
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Cumulative histogram of durations in seconds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Traffic:
+    """Traffic counters of one transport, sessions keep a reference to
+    counters of the transport they are connected with, so every event
+    updates one object."""
+
+    __slots__ = ('messages_in', 'bytes_in', 'frames_out', 'messages_out',
+                 'bytes_out', 'heartbeats')
+
+    def __init__(self):
+        self.messages_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.messages_out = 0
+        self.bytes_out = 0
+        self.heartbeats = 0
+
+
+def _total(name):
+    return property(
+        lambda self: sum(getattr(traffic, name)
+                         for traffic in self._traffic()),
+        doc='Total of ``Traffic.%s`` of all transports.' % name)
+
+
+class Metrics(Tracer):
+    """Counters of one session manager.
+
+    Installed with ``SessionManager(metrics=True)``, ``add_endpoint``
+    serves them in Prometheus text format on ``{prefix}/metrics``.
+
+    Handler latency is measured for every ``sample``-th message of
+    a transport.
+    Traffic of a session is also counted per transport it is connected
+    with, messages sent with ``xhr_send`` count for ``xhr`` session.
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, sample=16):
+        self.sample = sample
+        self.timing = False
+        self.opened = 0
+        self.closed = 0
+        self.heartbeats_skipped = 0
+        self.polls_saved = 0
+        self.slow_consumers = 0
+        self.requests = collections.Counter()
+        self.active = collections.Counter()
+        self.transports = {}  # transport name -> Traffic
+        self.untracked = Traffic()  # sessions without transport
+        self.handler = Histogram(buckets)
+        self.heartbeat = Histogram(buckets)
+        self.gc = Histogram(buckets)
+
+    def on_open(self, session):
+        self.opened += 1
+
+    messages_in = _total('messages_in')
+    bytes_in = _total('bytes_in')
+    frames_out = _total('frames_out')
+    messages_out = _total('messages_out')
+    bytes_out = _total('bytes_out')
+    heartbeats = _total('heartbeats')
+
+    def _traffic(self):
+        yield self.untracked
+        yield from self.transports.values()
+
+    def traffic(self, transport):
+        """Counters of ``transport``, created on first use."""
+        traffic = self.transports.get(transport)
+        if traffic is None:
+            traffic = self.transports[transport] = Traffic()
+        return traffic
+
+    def on_message_in(self, session, msg):
+        traffic = session._traffic or self.untracked
+        traffic.messages_in += 1
+        traffic.bytes_in += len(msg)
+        self.timing = not traffic.messages_in % self.sample
+
+    def on_frame_out(self, session, frame, data):
+        traffic = session._traffic or self.untracked
+        traffic.frames_out += 1
+        if frame == FRAME_MESSAGE:
+            traffic.messages_out += 1
+            traffic.bytes_out += len(data)
+        elif frame == FRAME_MESSAGE_BLOB:
+            traffic.bytes_out += len(data)
+        elif frame == FRAME_HEARTBEAT:
+            traffic.heartbeats += 1
+
+    def on_handler(self, session, duration):
+        self.handler.observe(duration)
+
+    def on_close(self, session):
+        self.closed += 1
+
+    def collect(self, manager):
+        """Metric samples, ``(name, type, labels, value)`` tuples."""
+        labels = (('endpoint', manager.name),)
+
+        states = collections.Counter()
+        queued = queued_bytes = 0
+        for session in manager.values():
+            states[session.state] += 1
+            queued += session._queued
+            queued_bytes += session._queued_bytes
+
+        for state, name in sorted(STATE_NAMES.items()):
+            yield ('sockjs_sessions', 'gauge',
+                   labels + (('state', name),), states[state])
+        yield ('sockjs_sessions_acquired', 'gauge',
+               labels, len(manager.acquired))
+        yield 'sockjs_queued_messages', 'gauge', labels, queued
+        yield 'sockjs_queued_bytes', 'gauge', labels, queued_bytes
+
+        userland = kernel = 0
+        for buffered, queued in manager.buffer_stats().values():
+            userland += buffered
+            kernel += queued or 0
+        yield ('sockjs_write_buffer_bytes', 'gauge',
+               labels + (('layer', 'userland'),), userland)
+        yield ('sockjs_write_buffer_bytes', 'gauge',
+               labels + (('layer', 'kernel'),), kernel)
+
+        for name, value in (
+                ('sockjs_sessions_opened_total', self.opened),
+                ('sockjs_sessions_closed_total', self.closed),
+                ('sockjs_messages_in_total', self.messages_in),
+                ('sockjs_bytes_in_total', self.bytes_in),
+                ('sockjs_frames_out_total', self.frames_out),
+                ('sockjs_messages_out_total', self.messages_out),
+                ('sockjs_bytes_out_total', self.bytes_out),
+                ('sockjs_heartbeats_total', self.heartbeats),
+                ('sockjs_heartbeats_skipped_total', self.heartbeats_skipped),
+                ('sockjs_polls_saved_total', self.polls_saved),
+                ('sockjs_slow_consumers_total', self.slow_consumers)):
+            yield name, 'counter', labels, value
+
+        for transport, value in sorted(self.requests.items()):
+            yield ('sockjs_transport_requests_total', 'counter',
+                   labels + (('transport', transport),), value)
+        for transport, value in sorted(self.active.items()):
+            yield ('sockjs_transport_active', 'gauge',
+                   labels + (('transport', transport),), value)
+        for transport, traffic in sorted(self.transports.items()):
+            label = labels + (('transport', transport),)
+            for name, value in (
+                    ('sockjs_transport_messages_in_total',
+                     traffic.messages_in),
+                    ('sockjs_transport_bytes_in_total', traffic.bytes_in),
+                    ('sockjs_transport_frames_out_total',
+                     traffic.frames_out),
+                    ('sockjs_transport_bytes_out_total', traffic.bytes_out)):
+                yield name, 'counter', label, value
+
+        if manager.admission is not None:
+            for reason, value in sorted(manager.admission.rejected.items()):
+                yield ('sockjs_sessions_rejected_total', 'counter',
+                       labels + (('reason', reason),), value)
+
+        if isinstance(manager.handler, ThreadPoolHandler):
+            stats = manager.handler.stats()
+            for name, key in (('sockjs_threadpool_workers', 'max_workers'),
+                              ('sockjs_threadpool_active', 'active'),
+                              ('sockjs_threadpool_queued', 'queued'),
+                              ('sockjs_threadpool_saturation', 'saturation')):
+                yield name, 'gauge', labels, stats[key]
+            yield ('sockjs_threadpool_calls_total', 'counter',
+                   labels, stats['completed'])
+
+        for name, histogram in (('sockjs_handler_seconds', self.handler),
+                                ('sockjs_heartbeat_seconds', self.heartbeat),
+                                ('sockjs_gc_seconds', self.gc)):
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else '%g' % bound
+                yield (name + '_bucket', 'histogram',
+                       labels + (('le', le),), count)
+            yield name + '_sum', 'histogram', labels, histogram.sum
+            yield name + '_count', 'histogram', labels, histogram.count
+
+
+def format_metrics(samples):
+    """Render samples in Prometheus text exposition format."""
+    lines = []
+    typed = set()
+    for name, kind, labels, value in samples:
+        family = name
+        if kind == 'histogram':
+            family = name.rsplit('_', 1)[0]
+        if family not in typed:
+            typed.add(family)
+            lines.append('# TYPE %s %s' % (family, kind))
+
+        label = ','.join('%s="%s"' % (key, str(val).replace('"', '\\"'))
+                         for key, val in labels)
+        lines.append('%s{%s} %s' % (name, label, value))
+
+    lines.append('')
+    return '\n'.join(lines)
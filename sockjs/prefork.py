@@ -0,0 +1,368 @@
+"""Prefork server
+
+Parent process accepts connections and hands every connection to one
+of the worker processes, one event loop per core. Requests for
+``{prefix}/{server}/{session}/{transport}`` go to the worker that owns
+``{server}``, other requests are spread round-robin. Requests that
+arrive on a kept-alive connection of another worker are proxied by
+``UnixSocketStore``.
+
+    def make_app(loop, **options):
+        app = web.Application(loop=loop)
+        sockjs.add_endpoint(app, handler, name='chat', **options)
+        return app
+
+    run_prefork(make_app, port=8080)
+
+or ``python -m sockjs.prefork mymodule:make_app --port 8080``.
+"""
+import argparse
+import array
+import asyncio
+import importlib
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
+
+from .backplane import UnixSocketBackplane, UnixSocketHub
+from .store import UnixSocketStore, owner_of
+from .transports import handlers
+
+log = logging.getLogger('sockjs')
+
+PEEK_SIZE = 8192  # request line must fit
+PEEK_TIMEOUT = 5.0
+PEEK_RETRY = 0.005
+
+_TRANSPORTS = frozenset(name.encode('ascii') for name in handlers)
+
+
+def route_request(head, workers):
+    """Worker index for request ``head``, None if request is not
+    bound to a session."""
+    line = head.split(b'\r\n', 1)[0].split(b' ')
+    if len(line) != 3:
+        return None
+
+    path = line[1].split(b'?', 1)[0].split(b'/')
+    if len(path) < 4 or path[-1] not in _TRANSPORTS or not path[-3]:
+        return None
+
+    try:
+        server = path[-3].decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    return owner_of(server, workers)
+
+
+def send_socket(channel, sock):
+    """Pass socket to the process on the other end of unix ``channel``."""
+    channel.sendmsg(
+        [b'\0'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                   array.array('i', [sock.fileno()]))])
+
+
+def recv_sockets(channel, maxfds=64):
+    """Receive sockets sent with ``send_socket()``, returns None
+    when channel is closed."""
+    fds = array.array('i')
+    msg, ancdata, flags, addr = channel.recvmsg(
+        maxfds, socket.CMSG_LEN(maxfds * fds.itemsize))
+    if not msg:
+        return None
+
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    return [socket.socket(fileno=fd) for fd in fds]
+
+
+class PreforkWorker:
+    """Serves application on connections received from parent."""
+
+    def __init__(self, app_factory, index, workers, channel, path,
+                 hub=None, *, loop=None):
+        self.loop = loop
+        self.index = index
+        self.channel = channel
+        options = {'store': UnixSocketStore(
+            os.path.join(path, 'worker-{}.sock'), index, workers, loop=loop)}
+        if hub is not None:
+            options['backplane'] = UnixSocketBackplane(hub, loop=loop)
+
+        self.app = app_factory(loop, **options)
+        self.handler = self.app.make_handler()
+
+    def _receive(self):
+        try:
+            socks = recv_sockets(self.channel)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            socks = None
+
+        if socks is None:
+            # parent is gone
+            self.loop.stop()
+            return
+
+        for sock in socks:
+            sock.setblocking(False)
+            ensure_future(self._connect(sock), loop=self.loop)
+
+    @asyncio.coroutine
+    def _connect(self, sock):
+        try:
+            connect = getattr(self.loop, 'connect_accepted_socket', None)
+            if connect is not None:
+                yield from connect(self.handler, sock)
+            else:  # pragma: no cover
+                yield from self.loop.create_connection(
+                    self.handler, sock=sock)
+        except OSError as exc:
+            log.warning('Can not serve connection: %s', exc)
+            sock.close()
+
+    def run(self):
+        loop = self.loop
+        loop.run_until_complete(self.app.startup())
+        self.channel.setblocking(False)
+        loop.add_reader(self.channel.fileno(), self._receive)
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+        loop.add_signal_handler(signal.SIGINT, loop.stop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.remove_reader(self.channel.fileno())
+            loop.run_until_complete(self.app.shutdown())
+            loop.run_until_complete(self.handler.shutdown(10.0))
+            loop.run_until_complete(self.app.cleanup())
+
+
+class PreforkServer:
+    """Accepts connections on ``host:port`` and dispatches them
+    to ``workers`` forked processes.
+
+    ``app_factory`` is called in every worker with event loop and
+    ``store``, ``backplane`` keyword arguments that are meant
+    for ``add_endpoint``. ``hub``: run ``UnixSocketHub`` in parent
+    so broadcasts reach sessions of all workers.
+
+    """
+
+    def __init__(self, app_factory, *, host='0.0.0.0', port=8080,
+                 workers=None, hub=True, backlog=128, loop=None):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.hub = hub
+        self.backlog = backlog
+        self.loop = loop
+        self.path = None
+        self.sock = None
+        self.pids = [None] * self.workers
+        self.channels = [None] * self.workers
+        self._hub = None
+        self._pending = set()
+        self._next = 0
+        self._running = False
+
+    def _spawn(self, index):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid:
+            child.close()
+            parent.setblocking(False)
+            self.pids[index] = pid
+            self.channels[index] = parent
+            return
+
+        # worker process, parent event loop must not be touched here
+        code = 0
+        try:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            parent.close()
+            self.sock.close()
+            for sock in self._pending:
+                sock.close()
+            for channel in self.channels:
+                if channel is not None:
+                    channel.close()
+            if self._hub is not None:
+                for sock in self._hub.server.sockets:
+                    sock.close()
+
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            hub = None
+            if self.hub:
+                hub = os.path.join(self.path, 'hub.sock')
+            PreforkWorker(self.app_factory, index, self.workers, child,
+                          self.path, hub, loop=loop).run()
+        except BaseException:
+            log.exception('Exception in prefork worker %d.', index)
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+
+            if pid in self.pids:
+                index = self.pids.index(pid)
+                self.pids[index] = None
+                self.channels[index].close()
+                self.channels[index] = None
+                if self._running:
+                    log.warning('Prefork worker %d exited, restarting.',
+                                index)
+                    self._spawn(index)
+
+    def _accept(self):
+        for _ in range(self.backlog):
+            try:
+                conn, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                log.warning('Can not accept connection: %s', exc)
+                return
+
+            conn.setblocking(False)
+            self._pending.add(conn)
+            self._peek(conn, self.loop.time() + PEEK_TIMEOUT)
+
+    def _peek(self, conn, deadline):
+        try:
+            head = conn.recv(PEEK_SIZE, socket.MSG_PEEK)
+        except (BlockingIOError, InterruptedError):
+            head = b''
+        except OSError:
+            self._pending.discard(conn)
+            conn.close()
+            return
+
+        if (b'\r\n' not in head and len(head) < PEEK_SIZE and
+                self.loop.time() < deadline):
+            # peeked data stays readable, poll instead of add_reader
+            self.loop.call_later(PEEK_RETRY, self._peek, conn, deadline)
+            return
+
+        self._dispatch(conn, route_request(head, self.workers))
+
+    def _dispatch(self, conn, index):
+        if index is None:
+            index = self._next
+            self._next = (self._next + 1) % self.workers
+
+        try:
+            for idx in range(self.workers):
+                channel = self.channels[(index + idx) % self.workers]
+                if channel is None:
+                    continue
+                try:
+                    send_socket(channel, conn)
+                    return
+                except OSError as exc:
+                    log.warning('Can not pass connection to worker: %s', exc)
+        finally:
+            self._pending.discard(conn)
+            conn.close()
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        self.path = tempfile.mkdtemp(prefix='sockjs-')
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(self.backlog)
+        self.sock.setblocking(False)
+
+        if self.hub:
+            self._hub = UnixSocketHub(
+                os.path.join(self.path, 'hub.sock'), loop=self.loop)
+            self.loop.run_until_complete(self._hub.start())
+
+        self._running = True
+        for index in range(self.workers):
+            self._spawn(index)
+
+        self.loop.add_reader(self.sock.fileno(), self._accept)
+        self.loop.add_signal_handler(signal.SIGCHLD, self._reap)
+
+    def stop(self):
+        self._running = False
+        self.loop.remove_signal_handler(signal.SIGCHLD)
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        for conn in self._pending:
+            conn.close()
+        self._pending.clear()
+
+        for pid in self.pids:
+            if pid is not None:
+                os.kill(pid, signal.SIGTERM)
+        for index, pid in enumerate(self.pids):
+            if pid is not None:
+                os.waitpid(pid, 0)
+                self.channels[index].close()
+
+        if self._hub is not None:
+            self.loop.run_until_complete(self._hub.stop())
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def run(self):
+        self.start()
+        print('======== Running on http://%s:%s/ (%d workers) ========' % (
+            self.host, self.port, self.workers))
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, self.loop.stop)
+            self.loop.run_forever()
+        except KeyboardInterrupt:  # pragma: no cover
+            pass
+        finally:
+            self.stop()
+
+
+def run_prefork(app_factory, **kwargs):
+    """Run ``PreforkServer`` until interrupted."""
+    PreforkServer(app_factory, **kwargs).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run prefork sockjs server.')
+    parser.add_argument('factory', help='module:function application factory')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes, one per core')
+    parser.add_argument('--no-hub', dest='hub', action='store_false',
+                        help='do not relay broadcasts between workers')
+    args = parser.parse_args(argv)
+
+    module, name = args.factory.split(':', 1)
+    factory = getattr(importlib.import_module(module), name)
+    logging.basicConfig(level=logging.INFO)
+    run_prefork(factory, host=args.host, port=args.port,
+                workers=args.workers, hub=args.hub)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
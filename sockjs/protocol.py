@@ -9,6 +9,11 @@ STATE_OPEN = 1
 STATE_CLOSING = 2
 STATE_CLOSED = 3
 
+# Outgoing queue overflow policies
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_CLOSE = 'close'
+
 
 _days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 _months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
@@ -91,6 +96,29 @@ def messages_frame(messages):
     return FRAME_MESSAGE + json.dumps(messages, **kwargs)
 
 
+class SharedFrame(str):
+    """Frame sent to many sessions, e.g. broadcast message.
+
+    ``encoded`` keeps transport encodings of the frame, so every
+    transport framing is built once for all recipients."""
+
+    def __init__(self, frame):
+        self.encoded = {}
+
+
+def encode_frame(frame, key, encoder):
+    """Encode frame with ``encoder``, result is cached under ``key``
+    for shared frames."""
+    if isinstance(frame, SharedFrame):
+        encoded = frame.encoded
+        data = encoded.get(key)
+        if data is None:
+            data = encoded[key] = encoder(frame)
+        return data
+
+    return encoder(frame)
+
+
 # Handler messages
 # ---------------------
 
@@ -98,6 +126,7 @@ MSG_OPEN = 1
 MSG_MESSAGE = 2
 MSG_CLOSE = 3
 MSG_CLOSED = 4
+MSG_MESSAGES = 5  # batch of messages, see SessionManager(batch=True)
 
 
 SockjsMessage = collections.namedtuple('SockjsMessage', ['tp', 'data'])
@@ -7,6 +7,9 @@ import inspect
 from aiohttp import web, hdrs
 
 from sockjs.session import SessionManager
+from sockjs.exceptions import SessionIsRemote, SessionRejected
+from sockjs.threadpool import ThreadPoolHandler
+from sockjs.metrics import format_metrics
 from sockjs.protocol import IFRAME_HTML
 from sockjs.transports import handlers
 from sockjs.transports.utils import session_cookie
@@ -28,12 +31,24 @@ def _gen_endpoint_name():
 def add_endpoint(app, handler, *, name='', prefix='/sockjs',
                  manager=None, disable_transports=(),
                  sockjs_cdn='http://cdn.sockjs.org/sockjs-0.3.4.min.js',
-                 cookie_needed=True):
+                 cookie_needed=True, threads=0, **options):
+    """Register sockjs routes, extra ``options`` are passed
+    to ``SessionManager``.
+
+    ``threads``: Run synchronous handler in a pool of this many threads,
+    see ``sockjs.threadpool.ThreadPoolHandler``.
+
+    """
 
     assert callable(handler), handler
     if (not asyncio.iscoroutinefunction(handler) and
             not inspect.isgeneratorfunction(handler)):
-        handler = asyncio.coroutine(handler)
+        if threads:
+            handler = ThreadPoolHandler(handler, threads, loop=app.loop)
+            app.on_cleanup.append(
+                lambda app: handler.shutdown(wait=False))
+        else:
+            handler = asyncio.coroutine(handler)
 
     router = app.router
 
@@ -42,7 +57,10 @@ def add_endpoint(app, handler, *, name='', prefix='/sockjs',
 
     # set session manager
     if manager is None:
-        manager = SessionManager(name, app, handler, app.loop)
+        manager = SessionManager(name, app, handler, app.loop, **options)
+    elif options:
+        raise ValueError(
+            'Session manager options can not be used with custom manager')
 
     if manager.name != name:
         raise ValueError(
@@ -90,6 +108,11 @@ def add_endpoint(app, handler, *, name='', prefix='/sockjs',
         '%s/info' % prefix,
         route.info_options, name='sockjs-info-options-%s' % name)
 
+    if manager.metrics is not None:
+        router.add_route(
+            hdrs.METH_GET, '%s/metrics' % prefix,
+            route.metrics, name='sockjs-metrics-%s' % name)
+
     route_name = 'sockjs-iframe-%s' % name
     router.add_route(
         hdrs.METH_GET,
@@ -100,6 +123,11 @@ def add_endpoint(app, handler, *, name='', prefix='/sockjs',
         hdrs.METH_GET,
         '%s/iframe{version}.html' % prefix, route.iframe, name=route_name)
 
+    # serve and forward sessions of other workers
+    if manager.store is not None:
+        app.on_startup.append(manager.store.start)
+        app.on_cleanup.append(manager.store.stop)
+
     # start session gc
     manager.start()
 
@@ -139,9 +167,21 @@ class SockJSRoute:
 
         try:
             session = manager.get(sid, create, request=request)
+        except SessionIsRemote as exc:
+            return (yield from manager.store.forward(request, exc.owner))
+        except SessionRejected:
+            return manager.admission.response()
         except KeyError:
             return web.HTTPNotFound(headers=session_cookie(request))
 
+        metrics = manager.metrics
+        if metrics is not None:
+            metrics.requests[tid] += 1
+            metrics.active[tid] += 1
+            # send-only transports count for transport of the session
+            if create:
+                session._traffic = metrics.traffic(tid)
+
         t = transport(manager, session, request)
         try:
             return (yield from t.process())
@@ -154,12 +194,24 @@ class SockJSRoute:
             if manager.is_acquired(session):
                 yield from manager.release(session)
             return web.HTTPInternalServerError()
+        finally:
+            if metrics is not None:
+                metrics.active[tid] -= 1
 
     @asyncio.coroutine
     def websocket(self, request):
         # session
         sid = '%0.9d' % random.randint(1, 2147483647)
-        session = self.manager.get(sid, True, request=request)
+        try:
+            session = self.manager.get(sid, True, request=request)
+        except SessionRejected:
+            return self.manager.admission.response()
+
+        metrics = self.manager.metrics
+        if metrics is not None:
+            metrics.requests['rawwebsocket'] += 1
+            metrics.active['rawwebsocket'] += 1
+            session._traffic = metrics.traffic('rawwebsocket')
 
         transport = RawWebSocketTransport(self.manager, session, request)
         try:
@@ -168,6 +220,9 @@ class SockJSRoute:
             raise
         except web.HTTPException as exc:
             return exc
+        finally:
+            if metrics is not None:
+                metrics.active['rawwebsocket'] -= 1
 
     def info(self, request):
         resp = web.Response(content_type='application/json')
@@ -192,6 +247,14 @@ class SockJSRoute:
         resp.headers.extend(session_cookie(request))
         return resp
 
+    def metrics(self, request):
+        manager = self.manager
+        resp = web.Response(
+            text=format_metrics(manager.metrics.collect(manager)),
+            content_type='text/plain')
+        resp.headers[hdrs.CACHE_CONTROL] = 'no-store, no-cache'
+        return resp
+
     def iframe(self, request):
         cached = request.headers.get(hdrs.IF_NONE_MATCH)
         if cached:
@@ -1,20 +1,59 @@
 import asyncio
 import collections
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
 
 from .protocol import STATE_NEW, STATE_OPEN, STATE_CLOSING, STATE_CLOSED
 from .protocol import FRAME_OPEN, FRAME_CLOSE
 from .protocol import FRAME_MESSAGE, FRAME_MESSAGE_BLOB, FRAME_HEARTBEAT
-from .exceptions import SessionIsAcquired, SessionIsClosed
-
-from .protocol import MSG_CLOSE, MSG_MESSAGE
+from .protocol import OVERFLOW_DROP_OLDEST, OVERFLOW_CLOSE
+from .exceptions import SessionIsAcquired, SessionIsClosed, SessionIsRemote
+from .clock import get_clock
+from .expiry import ExpiryWheel
+from .tracing import LoggingTracer, Tracers
+from .metrics import Metrics, clock
+
+from .protocol import MSG_CLOSE, MSG_MESSAGE, MSG_MESSAGES
 from .protocol import close_frame, message_frame, messages_frame
+from .protocol import dumps, loads, encode_frame
 from .protocol import SockjsMessage, OpenMessage, ClosedMessage
+from .protocol import SharedFrame
 
 
 log = logging.getLogger('sockjs')
 
+_debug_tracer = LoggingTracer()
+
+
+def _seconds(timeout):
+    if isinstance(timeout, timedelta):
+        return timeout.total_seconds()
+    return float(timeout)
+
+
+def _mergeable(frame, payload):
+    return frame == FRAME_MESSAGE or (
+        frame == FRAME_MESSAGE_BLOB and
+        payload.startswith('a[') and payload.endswith(']'))
+
+
+def _array_items(frame, payload):
+    if frame == FRAME_MESSAGE:
+        return dumps(payload)[1:-1]
+    else:
+        return payload[2:-1]
+
+
+def _count_messages(frame):
+    if frame.startswith('a[') and frame.endswith(']'):
+        return len(loads(frame[1:]))
+    return 0
+
 
 class Session(object):
     """ SockJS session object
@@ -25,31 +64,67 @@ class Session(object):
 
     ``acquired``: Acquired state, indicates that transport is using session
 
-    ``timeout``: Session timeout
+    ``timeout``: Session timeout in seconds
+
+    ``expires``: Session deadline in event loop time
+
+    ``seq``: Number of messages sent to client, see
+    ``SessionManager.resume()``
+
+    Session uses ``__slots__``, outgoing queue is allocated on demand
+    and released once it is drained.
 
     """
 
-    manager = None
-    acquired = False
-    state = STATE_NEW
-    interrupted = False
-    exception = None
+    __slots__ = ('id', 'handler', 'manager', 'registry', 'loop',
+                 'state', 'acquired', 'interrupted', 'exception',
+                 'expired', 'expires', 'timeout',
+                 '_owner', '_clock', '_expiry', '_bucket', '_hb_slot',
+                 '_hits', '_heartbeats', '_heartbeat_transport', '_polling',
+                 '_last_out', '_tracer', '_traffic', '_sink',
+                 '_waiter', '_queue', '_queued', '_queued_bytes',
+                 'seq', '_ring', '_inbox', '_inbox_task')
 
     def __init__(self, id, handler, *,
-                 timeout=timedelta(seconds=10), loop=None, debug=False):
+                 timeout=10.0, loop=None, debug=False):
         self.id = id
         self.handler = handler
-        self.expired = False
-        self.timeout = timeout
-        self.expires = datetime.now() + timeout
+        self.manager = None
+        self.registry = None
         self.loop = loop
 
+        self.state = STATE_NEW
+        self.acquired = False
+        self.interrupted = False
+        self.exception = None
+
+        self.expired = False
+        self.timeout = _seconds(timeout)
+
+        self._clock = get_clock(
+            loop if loop is not None else asyncio.get_event_loop())
+        self.expires = self._clock.time() + self.timeout
+
         self._hits = 0
         self._heartbeats = 0
         self._heartbeat_transport = False
-        self._debug = debug
+        self._polling = False
+        self._last_out = 0.0
+        self._tracer = _debug_tracer if debug else None
+        self._traffic = None  # metrics of connected transport
+        self._sink = None
         self._waiter = None
-        self._queue = collections.deque()
+        self._queue = ()
+        self._queued = 0
+        self._queued_bytes = 0
+        self.seq = 0
+        self._ring = ()
+        self._inbox = ()
+        self._inbox_task = None
+        self._owner = None
+        self._expiry = None
+        self._bucket = None
+        self._hb_slot = None
 
     def __str__(self):
         result = ['id=%r' % (self.id,)]
@@ -64,7 +139,7 @@ class Session(object):
         if self.acquired:
             result.append('acquired')
 
-        if len(self._queue):
+        if self._queue:
             result.append('queue[%s]' % len(self._queue))
         if self._hits:
             result.append('hits=%s' % self._hits)
@@ -77,22 +152,28 @@ class Session(object):
         self.expired = False
 
         if timeout is None:
-            self.expires = datetime.now() + self.timeout
+            self.expires = self._clock.time() + self.timeout
         else:
-            self.expires = datetime.now() + timeout
+            self.expires = self._clock.time() + timeout
+
+        # acquired session does not expire, see SessionManager.acquire()
+        if self._expiry is not None and not self.acquired:
+            self._expiry.touch(self)
 
     @asyncio.coroutine
-    def _acquire(self, manager, heartbeat=True):
+    def _acquire(self, manager, heartbeat=True, polling=False):
         self.acquired = True
         self.manager = manager
         self._heartbeat_transport = heartbeat
+        self._polling = polling
 
         self._tick()
         self._hits += 1
 
         if self.state == STATE_NEW:
-            log.debug('open session: %s', self.id)
             self.state = STATE_OPEN
+            if self._tracer is not None:
+                self._tracer.on_open(self)
             self._feed(FRAME_OPEN, FRAME_OPEN)
             try:
                 yield from self.handler(OpenMessage, self)
@@ -109,31 +190,190 @@ class Session(object):
         self.acquired = False
         self.manager = None
         self._heartbeat_transport = False
+        self._polling = False
+        self._sink = None
 
-    def _heartbeat(self):
+    def _heartbeat(self, since=None):
+        """Queue heartbeat frame, unless a frame was queued after
+        ``since``. Returns true if frame is queued."""
         self.expired = False
         self._tick()
         self._heartbeats += 1
-        if self._heartbeat:
-            self._feed(FRAME_HEARTBEAT, FRAME_HEARTBEAT)
+        if not self._heartbeat_transport:
+            return False
+        if since is not None and self._last_out > since:
+            return False
+        self._feed(FRAME_HEARTBEAT, FRAME_HEARTBEAT)
+        return True
 
     def _feed(self, frame, data):
+        queue = self._queue
+        idle = not queue
+        if idle:
+            # idle transport writes frame without queue
+            sink = self._sink
+            if (sink is not None and sink.direct and
+                    frame != FRAME_CLOSE and sink.write_direct(
+                        messages_frame((data,))
+                        if frame == FRAME_MESSAGE else data)):
+                if frame != FRAME_HEARTBEAT:
+                    self._last_out = self._clock.time()
+                if self._tracer is not None:
+                    self._tracer.on_frame_out(self, frame, data)
+                return
+
+            queue = self._queue = collections.deque()
+
         # pack messages
         if frame == FRAME_MESSAGE:
-            if self._queue and self._queue[-1][0] == FRAME_MESSAGE:
-                self._queue[-1][1].append(data)
+            if queue and queue[-1][0] == FRAME_MESSAGE:
+                queue[-1][1].append(data)
             else:
-                self._queue.append((frame, [data]))
+                queue.append((frame, [data]))
         else:
-            self._queue.append((frame, data))
+            queue.append((frame, data))
+
+        if frame == FRAME_MESSAGE or frame == FRAME_MESSAGE_BLOB:
+            self._queued += 1
+            self._queued_bytes += len(data)
+        # heartbeat does not count as traffic that makes next one needless
+        if frame != FRAME_HEARTBEAT and frame != FRAME_OPEN:
+            self._last_out = self._clock.time()
+
+        if self._tracer is not None:
+            self._tracer.on_frame_out(self, frame, data)
+
+        # frames queued after first one are flushed with it
+        if idle or self._sink is None:
+            self._notify()
+
+    def _notify(self):
+        """Wake up transport, sink is flushed by session manager."""
+        sink = self._sink
+        if sink is not None:
+            sink.manager._mark_dirty(self)
+            return
 
-        # notify waiter
         waiter = self._waiter
         if waiter is not None:
             self._waiter = None
             if not waiter.cancelled():
                 waiter.set_result(True)
 
+    def _popleft(self):
+        queue = self._queue
+        frame, payload = queue.popleft()
+
+        if not queue:
+            self._queue = ()
+            self._queued = self._queued_bytes = 0
+        elif frame == FRAME_MESSAGE:
+            self._queued -= len(payload)
+            self._queued_bytes -= sum(map(len, payload))
+        elif frame == FRAME_MESSAGE_BLOB:
+            self._queued -= 1
+            self._queued_bytes -= len(payload)
+
+        return frame, payload
+
+    def _drop_oldest(self):
+        queue = self._queue
+        for idx, (frame, payload) in enumerate(queue):
+            if frame == FRAME_MESSAGE:
+                msg = payload.pop(0)
+                if not payload:
+                    del queue[idx]
+                break
+            elif frame == FRAME_MESSAGE_BLOB:
+                msg = payload
+                del queue[idx]
+                break
+        else:
+            return False
+
+        self._queued -= 1
+        self._queued_bytes -= len(msg)
+        if not queue:
+            self._queue = ()
+        return True
+
+    def _drop_messages(self):
+        if self._queued:
+            queue = [(frame, payload) for frame, payload in self._queue
+                     if frame != FRAME_MESSAGE and
+                     frame != FRAME_MESSAGE_BLOB]
+            self._queue = collections.deque(queue) if queue else ()
+            self._queued = self._queued_bytes = 0
+
+    def _record(self, owner, frame, data):
+        """Keep sent message in resume ring, messages are numbered
+        in the order client receives them."""
+        if frame == FRAME_MESSAGE:
+            count = 1
+        else:
+            count = encode_frame(data, 'count', _count_messages)
+            if not count:
+                return
+
+        ring = self._ring
+        if not ring:
+            ring = self._ring = collections.deque(maxlen=owner.resume_buffer)
+        ring.append((self.seq + 1, count, frame, data))
+        self.seq += count
+
+    def _replay(self, seq, last_seq, ring):
+        """Send messages after ``last_seq`` from ``ring`` of a previous
+        session, False if some of them are not in the ring anymore."""
+        if last_seq > seq:
+            return False
+        if last_seq < seq and (not ring or ring[0][0] > last_seq + 1):
+            return False
+
+        for first, count, frame, data in ring:
+            if first + count - 1 <= last_seq:
+                continue
+            if first > last_seq:
+                if frame == FRAME_MESSAGE:
+                    self.send(data)
+                else:
+                    self.send_frame(data)
+            else:
+                # frame was partly received, values need not be strings
+                tail = loads(data[1:])[last_seq - first + 1:]
+                self.send_frame(messages_frame(tail))
+        return True
+
+    def _exceeds(self, owner, size):
+        max_frames = owner.max_queue_frames
+        max_bytes = owner.max_queue_bytes
+        return ((max_frames and self._queued >= max_frames) or
+                (max_bytes and self._queued_bytes + size > max_bytes))
+
+    def _overflow(self, owner, frame, data):
+        """Apply overflow policy, returns True if message is rejected."""
+        size = len(data)
+        if not self._exceeds(owner, size):
+            return False
+
+        policy = owner.overflow
+        if policy == OVERFLOW_DROP_OLDEST:
+            while self._exceeds(owner, size) and self._drop_oldest():
+                pass
+            rejected = bool(self._exceeds(owner, size))
+        else:
+            rejected = True
+            if policy == OVERFLOW_CLOSE:
+                self._drop_messages()
+                self.close(*owner.overflow_close)
+
+        if owner.on_overflow is not None:
+            try:
+                owner.on_overflow(self, frame, data)
+            except:
+                log.exception('Exception in overflow callback.')
+
+        return rejected
+
     @asyncio.coroutine
     def _wait(self, pack=True):
         if not self._queue and self.state != STATE_CLOSED:
@@ -141,18 +381,44 @@ class Session(object):
             self._waiter = asyncio.Future(loop=self.loop)
             yield from self._waiter
 
+            # frames queued shortly after the first one go out with it
+            owner = self._owner
+            if owner is not None and owner.flush_delay is not None:
+                yield from asyncio.sleep(owner.flush_delay, loop=self.loop)
+
         if self._queue:
-            frame, payload = self._queue.popleft()
-            if pack:
-                if frame == FRAME_CLOSE:
-                    return FRAME_CLOSE, close_frame(*payload)
-                elif frame == FRAME_MESSAGE:
-                    return FRAME_MESSAGE, messages_frame(payload)
-
-            return frame, payload
+            return self._take(pack)
         else:
             raise SessionIsClosed()
 
+    def _take(self, pack=True):
+        """Pop next queued frame without waiting, queue must not be
+        empty."""
+        frame, payload = self._popleft()
+        if pack:
+            if frame == FRAME_CLOSE:
+                return FRAME_CLOSE, close_frame(*payload)
+            elif frame == FRAME_MESSAGE or frame == FRAME_MESSAGE_BLOB:
+                return self._pack(frame, payload)
+
+        return frame, payload
+
+    def _pack(self, frame, payload):
+        """Merge consecutive queued messages and pre-encoded message
+        frames into one frame, encoded frames are not serialized again."""
+        queue = self._queue
+        if queue and _mergeable(*queue[0]) and _mergeable(frame, payload):
+            items = [_array_items(frame, payload)]
+            while queue and _mergeable(*queue[0]):
+                items.append(_array_items(*self._popleft()))
+                queue = self._queue
+
+            return FRAME_MESSAGE, 'a[%s]' % ','.join(filter(None, items))
+
+        if frame == FRAME_MESSAGE:
+            return FRAME_MESSAGE, messages_frame(payload)
+        return frame, payload
+
     @asyncio.coroutine
     def _remote_close(self, exc=None):
         """close session from remote."""
@@ -164,6 +430,14 @@ class Session(object):
         if exc is not None:
             self.exception = exc
             self.interrupted = True
+
+        # close comes after messages that are still handled
+        owner = self._owner
+        if owner is not None and owner.dispatcher is not None:
+            yield from owner.dispatcher.join(self)
+        if self._inbox_task is not None:
+            yield from asyncio.wait((self._inbox_task,), loop=self.loop)
+
         try:
             yield from self.handler(SockjsMessage(MSG_CLOSE, exc), self)
         except:
@@ -177,25 +451,39 @@ class Session(object):
         log.info('session closed: %s', self.id)
         self.state = STATE_CLOSED
         self.expire()
+        if self._tracer is not None:
+            self._tracer.on_close(self)
         try:
             yield from self.handler(ClosedMessage, self)
         except:
             log.exception('Exceptin in closed handler.')
 
-        # notify waiter
-        waiter = self._waiter
-        if waiter is not None:
-            self._waiter = None
-            if not waiter.cancelled():
-                waiter.set_result(True)
+        if self._owner is not None:
+            self._owner.unsubscribe(self)
+
+        self._notify()
 
     @asyncio.coroutine
     def _remote_message(self, msg):
-        log.debug('incoming message: %s, %s', self.id, msg[:200])
+        tracer = self._tracer
+        if tracer is not None:
+            tracer.on_message_in(self, msg)
         self._tick()
 
+        owner = self._owner
+        if owner is not None and owner.batch:
+            yield from self._batch_message(owner, msg)
+            return
+        if owner is not None and owner.dispatcher is not None:
+            yield from owner.dispatcher.dispatch(self, msg)
+            return
+
+        message = SockjsMessage(MSG_MESSAGE, msg)
         try:
-            yield from self.handler(SockjsMessage(MSG_MESSAGE, msg), self)
+            if tracer is None or not tracer.timing:
+                yield from self.handler(message, self)
+            else:
+                yield from self._traced(tracer, message)
         except:
             log.exception('Exceptin in message handler.')
 
@@ -203,13 +491,79 @@ class Session(object):
     def _remote_messages(self, messages):
         self._tick()
 
+        tracer = self._tracer
+        owner = self._owner
+        if owner is not None and owner.batch:
+            if tracer is not None:
+                for msg in messages:
+                    tracer.on_message_in(self, msg)
+            yield from self._handle_batch(list(messages))
+            return
+
+        dispatcher = owner.dispatcher if owner is not None else None
+
         for msg in messages:
-            log.debug('incoming message: %s, %s', self.id, msg[:200])
+            if tracer is not None:
+                tracer.on_message_in(self, msg)
+            if dispatcher is not None:
+                yield from dispatcher.dispatch(self, msg)
+                continue
             try:
-                yield from self.handler(SockjsMessage(MSG_MESSAGE, msg), self)
+                message = SockjsMessage(MSG_MESSAGE, msg)
+                if tracer is None or not tracer.timing:
+                    yield from self.handler(message, self)
+                else:
+                    yield from self._traced(tracer, message)
             except:
                 log.exception('Exceptin in message handler.')
 
+    @asyncio.coroutine
+    def _batch_message(self, owner, msg):
+        """Collect messages that arrive one by one, e.g. websocket
+        frames, handler gets the ones read in one loop iteration
+        as a batch."""
+        inbox = self._inbox
+        if not inbox:
+            inbox = self._inbox = []
+        inbox.append(msg)
+
+        task = self._inbox_task
+        if task is None:
+            self._inbox_task = ensure_future(
+                self._drain_inbox(), loop=self.loop)
+        elif len(inbox) >= owner.max_batch:
+            # handler is slower than client, stop reading
+            yield from asyncio.wait((task,), loop=self.loop)
+
+    @asyncio.coroutine
+    def _drain_inbox(self):
+        try:
+            while self._inbox:
+                batch, self._inbox = self._inbox, ()
+                yield from self._handle_batch(batch)
+        finally:
+            self._inbox_task = None
+
+    @asyncio.coroutine
+    def _handle_batch(self, messages):
+        message = SockjsMessage(MSG_MESSAGES, messages)
+        try:
+            tracer = self._tracer
+            if tracer is None or not tracer.timing:
+                yield from self.handler(message, self)
+            else:
+                yield from self._traced(tracer, message)
+        except:
+            log.exception('Exceptin in message handler.')
+
+    @asyncio.coroutine
+    def _traced(self, tracer, message):
+        started = clock()
+        try:
+            yield from self.handler(message, self)
+        finally:
+            tracer.on_handler(self, clock() - started)
+
     def expire(self):
         """Manually expire a session."""
         self.expired = True
@@ -218,23 +572,35 @@ class Session(object):
         """send message to client."""
         assert isinstance(msg, str), 'String is required'
 
-        if self._debug:
-            log.info('outgoing message: %s, %s', self.id, str(msg)[:200])
-
         if self.state != STATE_OPEN:
             return
 
+        owner = self._owner
+        if (owner is not None and
+                (owner.max_queue_frames or owner.max_queue_bytes) and
+                self._overflow(owner, FRAME_MESSAGE, msg)):
+            return
+
+        if owner is not None and owner.resume_buffer:
+            self._record(owner, FRAME_MESSAGE, msg)
+
         self._tick()
         self._feed(FRAME_MESSAGE, msg)
 
     def send_frame(self, frm):
         """send message frame to client."""
-        if self._debug:
-            log.info('outgoing message: %s, %s', self.id, frm[:200])
-
         if self.state != STATE_OPEN:
             return
 
+        owner = self._owner
+        if (owner is not None and
+                (owner.max_queue_frames or owner.max_queue_bytes) and
+                self._overflow(owner, FRAME_MESSAGE_BLOB, frm)):
+            return
+
+        if owner is not None and owner.resume_buffer:
+            self._record(owner, FRAME_MESSAGE_BLOB, frm)
+
         self._tick()
         self._feed(FRAME_MESSAGE_BLOB, frm)
 
@@ -243,9 +609,6 @@ class Session(object):
         if self.state in (STATE_CLOSING, STATE_CLOSED):
             return
 
-        if self._debug:
-            log.debug('close session: %s', self.id)
-
         self.state = STATE_CLOSING
         self._feed(FRAME_CLOSE, (code, reason))
 
@@ -254,24 +617,129 @@ _marker = object()
 
 
 class SessionManager(dict):
-    """A basic session manager."""
+    """A basic session manager.
+
+    ``max_queue_frames``, ``max_queue_bytes``: Limits of outgoing
+    messages queued per session, number of messages and total length
+    of message text. ``0`` disables a limit.
+
+    ``overflow``: What to do with a message that exceeds a limit,
+    ``OVERFLOW_DROP_OLDEST``, ``OVERFLOW_DROP_NEWEST`` or
+    ``OVERFLOW_CLOSE``. Closing drops queued messages and closes session
+    with ``overflow_close`` code and reason.
+
+    ``on_overflow``: Callable, called with session, frame type and
+    message after overflow policy is applied.
+
+    ``backplane``: ``sockjs.backplane.Backplane`` instance, broadcasts
+    and channel messages are also delivered to managers with the same
+    name in other processes.
+
+    ``store``: ``sockjs.store.SessionStore`` instance, ``get()`` raises
+    ``SessionIsRemote`` for requests of sessions owned by another
+    worker process.
+
+    ``resume_buffer``: Number of last sent messages kept per session,
+    ``0`` disables resume. Messages of closed sessions are kept for
+    ``resume_timeout`` seconds. See ``resume()``. Can not be used with
+    ``OVERFLOW_DROP_OLDEST``, dropped messages are already numbered.
+
+    ``dispatcher``: ``sockjs.dispatch.Dispatcher`` instance, incoming
+    messages of a session are handled concurrently.
+
+    ``batch``: Handler gets all messages of one ``xhr_send`` or
+    ``jsonp_send`` request, or websocket messages that arrived together
+    (at most ``max_batch``), as one ``MSG_MESSAGES`` message with
+    a list of texts. ``dispatcher`` is not used in batch mode.
+
+    ``tracer``: ``sockjs.tracing.Tracer`` instance, gets session events
+    and messages. ``debug`` installs ``LoggingTracer``.
+
+    ``metrics``: Collect ``sockjs.metrics.Metrics``, ``add_endpoint``
+    serves them on ``{prefix}/metrics``.
+
+    ``heartbeat_slots``: Acquired sessions are split into this many
+    slots by acquire time, every ``heartbeat / heartbeat_slots`` seconds
+    one slot gets heartbeats and expired sessions are collected.
+
+    ``gc_concurrency``: Number of expired sessions closed concurrently,
+    GC runs in its own task and does not delay heartbeats.
+
+    ``admission``: ``sockjs.admission.Admission`` instance, ``get()``
+    raises ``SessionRejected`` instead of creating a session over its
+    caps.
+
+    ``flush_delay``: Seconds transport waits after first outgoing frame
+    of idle session, messages queued meanwhile are sent in one frame.
+    ``0`` waits until next event loop iteration, ``None`` sends at once.
+
+    Transports that register as session sink are not woken up per
+    session, manager keeps a set of sessions with queued frames and
+    flushes all of them once per loop iteration, or after
+    ``flush_delay``.
+
+    """
 
     _hb_handle = None  # heartbeat event loop timer
     _hb_task = None  # gc task
 
     def __init__(self, name, app, handler, loop,
-                 heartbeat=25.0, timeout=timedelta(seconds=5), debug=False):
+                 heartbeat=25.0, timeout=5.0, debug=False,
+                 max_queue_frames=0, max_queue_bytes=0,
+                 overflow=OVERFLOW_CLOSE,
+                 overflow_close=(3000, 'Queue overflow'),
+                 on_overflow=None, backplane=None, store=None,
+                 resume_buffer=0, resume_timeout=60.0, dispatcher=None,
+                 batch=False, max_batch=100, tracer=None, metrics=False,
+                 heartbeat_slots=10, gc_concurrency=16, admission=None,
+                 flush_delay=None):
         self.name = name
         self.route_name = 'sockjs-url-%s' % name
+        if resume_buffer and overflow == OVERFLOW_DROP_OLDEST:
+            raise ValueError(
+                'resume_buffer can not be used with OVERFLOW_DROP_OLDEST')
+
         self.app = app
         self.handler = handler
         self.factory = Session
         self.acquired = {}
-        self.sessions = []
         self.heartbeat = heartbeat
-        self.timeout = timeout
+        self.timeout = _seconds(timeout)
         self.loop = loop
         self.debug = debug
+        self.max_queue_frames = max_queue_frames
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = overflow
+        self.overflow_close = overflow_close
+        self.on_overflow = on_overflow
+        self.backplane = backplane
+        self.store = store
+        self.resume_buffer = resume_buffer
+        self.resume_timeout = _seconds(resume_timeout)
+        self.dispatcher = dispatcher
+        self.batch = batch
+        self.max_batch = max_batch
+        self.gc_concurrency = max(1, gc_concurrency)
+        self.admission = admission
+        self.flush_delay = flush_delay
+        if tracer is None and debug:
+            tracer = _debug_tracer
+        self.metrics = None
+        if metrics:
+            self.metrics = Metrics()
+            tracer = self.metrics if tracer is None else Tracers(
+                tracer, self.metrics)
+        self.tracer = tracer
+        self._clock = get_clock(loop)
+        self._expiry = ExpiryWheel()
+        self._channels = {}
+        self._subscriptions = {}
+        self._retained = collections.OrderedDict()
+        self.streams = {}  # session id -> streaming transport
+        self._dirty = set()  # sessions with frames for their sink
+        self._flush_handle = None
+        self._hb_slots = [set() for _ in range(max(1, heartbeat_slots))]
+        self._hb_tick = 0
 
     def route_url(self, request):
         return request.route_url(self.route_name)
@@ -282,54 +750,142 @@ class SessionManager(dict):
 
     def start(self):
         if not self._hb_handle:
+            self._clock.start()
+            if self.backplane is not None:
+                self.backplane.register(self)
             self._hb_handle = self.loop.call_later(
-                self.heartbeat, self._heartbeat)
+                self._hb_interval, self._heartbeat)
 
     def stop(self):
         if self._hb_handle is not None:
+            self._clock.stop()
+            if self.backplane is not None:
+                self.backplane.unregister(self)
             self._hb_handle.cancel()
             self._hb_handle = None
         if self._hb_task is not None:
             self._hb_task.cancel()
             self._hb_task = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+            self._dirty.clear()
+
+    def _mark_dirty(self, session):
+        self._dirty.add(session)
+        if self._flush_handle is None:
+            if self.flush_delay:
+                self._flush_handle = self.loop.call_later(
+                    self.flush_delay, self._flush)
+            else:
+                self._flush_handle = self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        """Write queued frames of all dirty sessions to their sinks."""
+        self._flush_handle = None
+        dirty, self._dirty = self._dirty, set()
+        for session in dirty:
+            sink = session._sink
+            if sink is not None:
+                try:
+                    sink.flush(session)
+                except Exception:
+                    log.exception('Exception in transport flush.')
+
+    @property
+    def _hb_interval(self):
+        return self.heartbeat / len(self._hb_slots)
 
     def _heartbeat(self):
-        if self._hb_task is None:
-            self._hb_task = asyncio.async(
-                self._heartbeat_task(), loop=self.loop)
+        """Heartbeat tick, expired sessions are closed by GC task which
+        does not delay next tick."""
+        started = clock()
+        now = self._clock.time()
+
+        # sessions with outgoing frames during last period are skipped
+        since = now - self.heartbeat
+        skipped = polls = 0
+        slots = self._hb_slots
+        for session in slots[self._hb_tick % len(slots)]:
+            if not session._heartbeat(since) and session._heartbeat_transport:
+                skipped += 1
+                polls += session._polling
+        self._hb_tick += 1
 
-    @asyncio.coroutine
-    def _heartbeat_task(self):
-        sessions = self.sessions
+        if self._hb_task is None:
+            self._hb_task = ensure_future(self._gc_task(), loop=self.loop)
 
-        if sessions:
-            now = datetime.now()
+        if self.metrics is not None:
+            self.metrics.heartbeats_skipped += skipped
+            self.metrics.polls_saved += polls
+            self.metrics.heartbeat.observe(clock() - started)
 
-            idx = 0
-            while idx < len(sessions):
-                session = sessions[idx]
+        self._hb_handle = self.loop.call_later(
+            self._hb_interval, self._heartbeat)
 
+    @asyncio.coroutine
+    def _gc_task(self):
+        """Close expired sessions, at most ``gc_concurrency`` at once."""
+        started = clock()
+        now = self._clock.time()
+        closing = set()
+        try:
+            for session in self._expiry.expired(now):
+                # session could be used while previous ones were closing
                 if session.acquired:
-                    session._heartbeat()
-
-                elif session.expires < now:
-                    # Session is to be GC'd immedietely
-                    if session.id in self.acquired:
-                        yield from self.release(session)
-                    if session.state == STATE_OPEN:
-                        yield from session._remote_close()
-                    if session.state == STATE_CLOSING:
-                        yield from session._remote_closed()
-
-                    del self[session.id]
-                    del self.sessions[idx]
+                    continue
+                if session.expires >= now:
+                    self._expiry.touch(session)
                     continue
 
-                idx += 1
+                if len(closing) >= self.gc_concurrency:
+                    _, closing = yield from asyncio.wait(
+                        closing, loop=self.loop,
+                        return_when=asyncio.FIRST_COMPLETED)
 
-        self._hb_task = None
-        self._hb_handle = self.loop.call_later(
-            self.heartbeat, self._heartbeat)
+                closing.add(ensure_future(
+                    self._collect(session, now), loop=self.loop))
+
+            if closing:
+                yield from asyncio.wait(closing, loop=self.loop)
+
+            retained = self._retained
+            while retained and next(iter(retained.values()))[0] < now:
+                retained.popitem(last=False)
+
+            if self.metrics is not None:
+                self.metrics.gc.observe(clock() - started)
+        except asyncio.CancelledError:
+            for task in closing:
+                task.cancel()
+            raise
+        finally:
+            self._hb_task = None
+
+    @asyncio.coroutine
+    def _collect(self, session, now):
+        # Session is to be GC'd immedietely
+        try:
+            if session.id in self.acquired:
+                yield from self.release(session)
+            if session.state == STATE_OPEN:
+                yield from session._remote_close()
+            if session.state == STATE_CLOSING:
+                yield from session._remote_closed()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception('Exception in closing expired session.')
+
+        self._expiry.discard(session)
+        self.unsubscribe(session)
+        if self.get(session.id, default=None) is session:
+            del self[session.id]
+            if self.admission is not None:
+                self.admission.closed(session)
+            if session._ring:
+                self._retained[session.id] = (
+                    now + self.resume_timeout, session.seq, session._ring)
 
     def _add(self, session):
         if session.expired:
@@ -339,18 +895,32 @@ class SessionManager(dict):
         session.registry = self.app
 
         self[session.id] = session
-        self.sessions.append(session)
+        session._owner = self
+        session._tracer = self.tracer
+        session._expiry = self._expiry
+        self._expiry.touch(session)
         return session
 
     def get(self, id, create=False, request=None, default=_marker):
+        if request is not None and self.store is not None:
+            owner = self.store.owner(request)
+            if owner is not None:
+                raise SessionIsRemote(owner)
+
         session = super(SessionManager, self).get(id, None)
         if session is None:
             if create:
+                admission = self.admission
+                if admission is not None:
+                    client = admission.check(
+                        self, request, self._clock.time())
                 session = self._add(
                     self.factory(
                         id, self.handler,
                         timeout=self.timeout,
                         loop=self.loop, debug=self.debug))
+                if admission is not None:
+                    admission.opened(session, client)
             else:
                 if default is not _marker:
                     return default
@@ -359,7 +929,9 @@ class SessionManager(dict):
         return session
 
     @asyncio.coroutine
-    def acquire(self, s):
+    def acquire(self, s, polling=False):
+        """Attach session to a transport, ``polling`` transport ends
+        request on every frame."""
         sid = s.id
 
         if sid in self.acquired:
@@ -367,9 +939,15 @@ class SessionManager(dict):
         if sid not in self:
             raise KeyError('Unknown session')
 
-        yield from s._acquire(self)
+        yield from s._acquire(self, polling=polling)
 
-        self.acquired[sid] = True
+        # acquired session is not indexed by deadline until release
+        self._expiry.discard(s)
+        self.acquired[sid] = s
+        # slot that was just ticked, next heartbeat is a full period away
+        slots = self._hb_slots
+        s._hb_slot = slots[(self._hb_tick - 1) % len(slots)]
+        s._hb_slot.add(s)
         return s
 
     def is_acquired(self, session):
@@ -380,6 +958,18 @@ class SessionManager(dict):
         if s.id in self.acquired:
             s._release()
             del self.acquired[s.id]
+            # index by fresh deadline, closed session stays expired
+            s.expires = s._clock.time() + s.timeout
+            self._expiry.touch(s)
+            if s._hb_slot is not None:
+                s._hb_slot.discard(s)
+                s._hb_slot = None
+
+    def buffer_stats(self):
+        """Userland and kernel write buffer sizes of streaming
+        connections, by session id."""
+        return {sid: transport.buffer_stats()
+                for sid, transport in self.streams.items()}
 
     def active_sessions(self):
         for session in self.values():
@@ -393,13 +983,103 @@ class SessionManager(dict):
             if session.state != STATE_CLOSED:
                 yield from session._remote_closed()
 
-        self.sessions.clear()
+        self._expiry.clear()
+        self._channels.clear()
+        self._subscriptions.clear()
+        self._retained.clear()
+        if self.admission is not None:
+            self.admission.clear()
         super(SessionManager, self).clear()
 
+    def resume(self, session, id, last_seq):
+        """Send messages that previous session ``id`` sent after
+        ``last_seq`` to ``session``.
+
+        Client counts messages it receives, ``seq`` of first message
+        is ``1``. How reconnected client reports previous session id
+        and its count is up to application. Previous session is closed.
+        Returns False if messages are not available anymore and client
+        has to resync its state.
+
+        """
+        previous = self.get(id, default=None)
+        if previous is not None and previous is not session:
+            seq, ring = previous.seq, previous._ring
+            previous._ring = ()
+            previous.close()
+        elif id in self._retained:
+            deadline, seq, ring = self._retained.pop(id)
+        else:
+            return False
+
+        return session._replay(seq, last_seq, ring)
+
     def broadcast(self, message):
-        blob = message_frame(message)
+        blob = SharedFrame(message_frame(message))
+        self._deliver(None, blob)
+
+        if self.backplane is not None:
+            self.backplane.publish(self, None, blob)
+
+    def subscribe(self, session, channel):
+        """Subscribe session to channel, session is unsubscribed
+        from all channels when it is closed."""
+        subscribers = self._channels.get(channel)
+        if subscribers is None:
+            subscribers = self._channels[channel] = set()
+        subscribers.add(session)
+
+        channels = self._subscriptions.get(session)
+        if channels is None:
+            channels = self._subscriptions[session] = set()
+        channels.add(channel)
+
+    def unsubscribe(self, session, channel=None):
+        """Unsubscribe session from channel or from all channels."""
+        if channel is None:
+            channels = self._subscriptions.pop(session, ())
+        else:
+            channels = self._subscriptions.get(session)
+            if channels is None or channel not in channels:
+                return
+            channels.discard(channel)
+            if not channels:
+                del self._subscriptions[session]
+            channels = (channel,)
+
+        for name in channels:
+            subscribers = self._channels[name]
+            subscribers.discard(session)
+            if not subscribers:
+                del self._channels[name]
+
+    def subscribers(self, channel):
+        """Sessions subscribed to channel."""
+        return frozenset(self._channels.get(channel, ()))
+
+    def publish(self, channel, message):
+        """Send message to sessions subscribed to channel."""
+        blob = SharedFrame(message_frame(message))
+        self._deliver(channel, blob)
+
+        if self.backplane is not None:
+            self.backplane.publish(self, channel, blob)
+
+    def _deliver(self, channel, blob):
+        """Send message frame to local sessions, to all sessions
+        if ``channel`` is None."""
+        if channel is None:
+            sessions = self.values()
+        else:
+            subscribers = self._channels.get(channel)
+            if not subscribers:
+                return
+            sessions = list(subscribers)
 
-        for session in self.values():
+        if not isinstance(blob, SharedFrame):
+            blob = SharedFrame(blob)
+
+        for session in sessions:
             if not session.expired:
                 session.send_frame(blob)
 
@@ -0,0 +1,209 @@
+"""Session stores
+
+Store decides which worker process owns a session. Requests for
+sessions owned by another worker are proxied to that worker, so
+polling transports work behind SO_REUSEPORT without sticky sessions.
+"""
+import asyncio
+import logging
+import os
+import zlib
+from http.cookies import SimpleCookie
+
+import aiohttp
+from aiohttp import hdrs, web
+from aiohttp.abc import AbstractCookieJar
+from multidict import CIMultiDict
+
+log = logging.getLogger('sockjs')
+
+FORWARDED = 'X-SockJS-Forwarded'
+FORWARDED_FOR = 'X-SockJS-Forwarded-For'
+
+HOP_HEADERS = frozenset(name.upper() for name in (
+    hdrs.CONNECTION, hdrs.KEEP_ALIVE, hdrs.TRANSFER_ENCODING,
+    hdrs.CONTENT_LENGTH, hdrs.CONTENT_ENCODING, hdrs.UPGRADE))
+
+
+def peer_host(request):
+    """Address of connected peer, ``''`` for unix socket peers."""
+    transport = request.transport
+    if transport is None:
+        return None
+    peername = transport.get_extra_info('peername')
+    if isinstance(peername, (list, tuple)):
+        return peername[0]
+    return peername
+
+
+def owner_of(server, workers):
+    """Worker index for ``{server}`` url segment of a session.
+
+    Clients keep ``{server}`` for all requests of a session, so every
+    worker computes the same owner.
+    """
+    return zlib.crc32(server.encode('utf-8')) % workers
+
+
+class SessionStore:
+    """Process local store, all sessions are owned by this process."""
+
+    def owner(self, request):
+        """Worker that owns requested session, None for this process."""
+        return None
+
+    @asyncio.coroutine
+    def start(self, app):
+        pass
+
+    @asyncio.coroutine
+    def stop(self, app):
+        pass
+
+    @asyncio.coroutine
+    def forward(self, request, owner):
+        raise NotImplementedError
+
+
+class _NoCookies(AbstractCookieJar):
+    """Proxy client is shared by all users, it must not keep cookies."""
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def clear(self):
+        pass
+
+    def update_cookies(self, cookies, response_url=None):
+        pass
+
+    def filter_cookies(self, request_url):
+        return SimpleCookie()
+
+
+class UnixSocketStore(SessionStore):
+    """Sessions are spread over ``workers`` processes by ``{server}``
+    url segment.
+
+    Every worker serves application on its own unix socket, ``path``
+    is a format string with ``{}`` replaced by worker index, e.g.
+    ``'/run/app/worker-{}.sock'``. Requests for sessions of other
+    workers are proxied to their sockets. Raw websocket is always
+    handled by the worker that accepted the connection.
+
+    ``add_endpoint`` starts and stops the store with the application.
+
+    """
+
+    def __init__(self, path, worker, workers, *, loop=None):
+        if not 0 <= worker < workers:
+            raise ValueError('Worker index is out of range')
+
+        self.path = path
+        self.worker = worker
+        self.workers = workers
+        self.loop = loop
+        self.server = None
+        self._clients = {}
+
+    def owner(self, request):
+        if FORWARDED in request.headers:
+            return None
+
+        info = request.match_info
+        server = info.get('server')
+        if not server or info.get('transport') == 'websocket':
+            return None
+
+        owner = owner_of(server, self.workers)
+        if owner == self.worker:
+            return None
+        return owner
+
+    @asyncio.coroutine
+    def start(self, app):
+        if self.server is not None:
+            return
+        if self.loop is None:
+            self.loop = app.loop
+
+        path = self.path.format(self.worker)
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.server = yield from self.loop.create_unix_server(
+            app.make_handler(), path)
+
+    @asyncio.coroutine
+    def stop(self, app):
+        if self.server is not None:
+            self.server.close()
+            yield from self.server.wait_closed()
+            self.server = None
+
+            path = self.path.format(self.worker)
+            if os.path.exists(path):
+                os.unlink(path)
+
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+    def _client(self, owner):
+        client = self._clients.get(owner)
+        if client is None:
+            connector = aiohttp.UnixConnector(
+                self.path.format(owner), loop=self.loop)
+            client = self._clients[owner] = aiohttp.ClientSession(
+                connector=connector, loop=self.loop,
+                cookie_jar=_NoCookies(loop=self.loop))
+        return client
+
+    @asyncio.coroutine
+    def forward(self, request, owner):
+        """Proxy request to owner worker, response is streamed back."""
+        headers = CIMultiDict(
+            (name, value) for name, value in request.headers.items()
+            if name.upper() not in HOP_HEADERS)
+        headers[FORWARDED] = str(self.worker)
+        headers[FORWARDED_FOR] = peer_host(request) or ''
+        body = yield from request.read()
+
+        try:
+            upstream = yield from self._client(owner).request(
+                request.method,
+                'http://%s%s' % (request.host, request.raw_path),
+                headers=headers, data=body or None,
+                allow_redirects=False,
+                skip_auto_headers=(hdrs.USER_AGENT, hdrs.ACCEPT,
+                                   hdrs.ACCEPT_ENCODING))
+        except (aiohttp.ClientError, OSError) as exc:
+            log.warning('Can not forward request to worker %s: %s',
+                        owner, exc)
+            return web.HTTPBadGateway()
+
+        try:
+            response = web.StreamResponse(
+                status=upstream.status, reason=upstream.reason)
+            response.headers.extend(
+                (name, value) for name, value in upstream.headers.items()
+                if name.upper() not in HOP_HEADERS)
+            yield from response.prepare(request)
+
+            while True:
+                chunk = yield from upstream.content.readany()
+                if not chunk:
+                    break
+                response.write(chunk)
+                yield from response.drain()
+
+            yield from response.write_eof()
+        except Exception:
+            upstream.close()
+            raise
+
+        yield from upstream.release()
+        return response
@@ -0,0 +1,198 @@
+"""Thread pool execution of synchronous handlers"""
+import asyncio
+import collections
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .protocol import ClosedMessage
+
+log = logging.getLogger('sockjs')
+
+
+def _unwrap(session):
+    if isinstance(session, ThreadSession):
+        return session._session
+    return session
+
+
+class ThreadSession:
+    """Session seen by handler running in a worker thread.
+
+    ``send()``, ``send_frame()``, ``close()`` and calls to ``manager``
+    are queued and applied in event loop thread in call order, other
+    attributes are read from session as is.
+
+    """
+
+    def __init__(self, session, loop):
+        self._session = session
+        self._loop = loop
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._manager = None
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def _call(self, func, *args):
+        self._calls.append((func, args))
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._loop.call_soon_threadsafe(self._flush)
+
+    def _call_wait(self, func, *args):
+        """Apply call in event loop thread and return its result."""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(func(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+
+        self._call(run)
+        return future.result()
+
+    def _flush(self):
+        with self._lock:
+            self._scheduled = False
+
+        calls = self._calls
+        while calls:
+            func, args = calls.popleft()
+            func(*args)
+
+    @property
+    def manager(self):
+        manager = self._session.manager
+        if manager is None:
+            return None
+        if self._manager is None or self._manager._manager is not manager:
+            self._manager = ThreadManager(manager, self)
+        return self._manager
+
+    def send(self, msg):
+        self._call(self._session.send, msg)
+
+    def send_frame(self, frm):
+        self._call(self._session.send_frame, frm)
+
+    def close(self, code=3000, reason='Go away!'):
+        self._call(self._session.close, code, reason)
+
+
+class ThreadManager:
+    """Session manager seen by handler running in a worker thread.
+
+    Calls that change manager state are applied in event loop thread,
+    queued with calls of the session handler got.
+
+    """
+
+    def __init__(self, manager, proxy):
+        self._manager = manager
+        self._proxy = proxy
+
+    def __getattr__(self, name):
+        return getattr(self._manager, name)
+
+    def broadcast(self, message):
+        self._proxy._call(self._manager.broadcast, message)
+
+    def publish(self, channel, message):
+        self._proxy._call(self._manager.publish, channel, message)
+
+    def subscribe(self, session, channel):
+        self._proxy._call(
+            self._manager.subscribe, _unwrap(session), channel)
+
+    def unsubscribe(self, session, channel=None):
+        self._proxy._call(
+            self._manager.unsubscribe, _unwrap(session), channel)
+
+    def subscribers(self, channel):
+        return self._proxy._call_wait(self._manager.subscribers, channel)
+
+    def resume(self, session, id, last_seq):
+        return self._proxy._call_wait(
+            self._manager.resume, _unwrap(session), id, last_seq)
+
+
+class ThreadPoolHandler:
+    """Runs synchronous ``handler`` in a pool of ``max_workers`` threads.
+
+    Calls for one session are run one after another in order, handler
+    gets the same ``ThreadSession`` for a session until it is closed.
+
+    """
+
+    def __init__(self, handler, max_workers=4, *, loop=None):
+        self.handler = handler
+        self.max_workers = max_workers
+        self.loop = loop
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.submitted = 0
+        self.completed = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._proxies = {}
+
+    @asyncio.coroutine
+    def __call__(self, msg, session):
+        loop = self.loop
+        if loop is None:
+            loop = self.loop = session.loop
+
+        proxy = self._proxies.get(session)
+        if proxy is None:
+            proxy = self._proxies[session] = ThreadSession(session, loop)
+        if msg == ClosedMessage:
+            del self._proxies[session]
+
+        previous = self._sessions.get(session)
+        done = self._sessions[session] = asyncio.Future(loop=loop)
+        try:
+            if previous is not None:
+                yield from asyncio.wait((previous,), loop=loop)
+
+            self.submitted += 1
+            yield from loop.run_in_executor(
+                self.executor, self._run, msg, proxy)
+        finally:
+            done.set_result(None)
+            if self._sessions.get(session) is done:
+                del self._sessions[session]
+            # apply calls made just before handler returned
+            proxy._flush()
+
+    def _run(self, msg, proxy):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            return self.handler(msg, proxy)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self):
+        """Pool saturation: calls running in threads, calls waiting
+        for a free thread and ``saturation``, share of busy threads."""
+        active = self.active
+        return {'max_workers': self.max_workers,
+                'active': active,
+                'max_active': self.max_active,
+                'queued': max(0, self.submitted - self.completed - active),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'saturation': active / self.max_workers}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
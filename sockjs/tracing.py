@@ -0,0 +1,89 @@
+"""Session tracing hooks
+
+Tracer is installed per session manager with ``SessionManager(tracer=...)``,
+sessions check for it once per event, without tracer nothing else runs.
+"""
+import logging
+
+log = logging.getLogger('sockjs')
+
+
+class Tracer:
+    """Base tracer, all hooks do nothing.
+
+    ``on_handler`` is called for handler calls made while ``timing``
+    is true.
+
+    """
+
+    timing = False
+
+    def on_open(self, session):
+        """Session is opened by first transport request."""
+
+    def on_message_in(self, session, msg):
+        """Message text is received from client."""
+
+    def on_frame_out(self, session, frame, data):
+        """Frame is queued for client, ``frame`` is one of
+        ``FRAME_*`` constants."""
+
+    def on_handler(self, session, duration):
+        """Handler call took ``duration`` seconds."""
+
+    def on_close(self, session):
+        """Session is closed."""
+
+
+class Tracers(Tracer):
+    """Passes events to several tracers."""
+
+    def __init__(self, *tracers):
+        self.tracers = tracers
+
+    @property
+    def timing(self):
+        return any(tracer.timing for tracer in self.tracers)
+
+    def on_open(self, session):
+        for tracer in self.tracers:
+            tracer.on_open(session)
+
+    def on_message_in(self, session, msg):
+        for tracer in self.tracers:
+            tracer.on_message_in(session, msg)
+
+    def on_frame_out(self, session, frame, data):
+        for tracer in self.tracers:
+            tracer.on_frame_out(session, frame, data)
+
+    def on_handler(self, session, duration):
+        for tracer in self.tracers:
+            tracer.on_handler(session, duration)
+
+    def on_close(self, session):
+        for tracer in self.tracers:
+            tracer.on_close(session)
+
+
+class LoggingTracer(Tracer):
+    """Logs session events and messages, used in debug mode."""
+
+    def __init__(self, logger=log, level=logging.DEBUG, limit=200):
+        self.logger = logger
+        self.level = level
+        self.limit = limit
+
+    def on_open(self, session):
+        self.logger.log(self.level, 'open session: %s', session.id)
+
+    def on_message_in(self, session, msg):
+        self.logger.log(self.level, 'incoming message: %s, %s',
+                        session.id, msg[:self.limit])
+
+    def on_frame_out(self, session, frame, data):
+        self.logger.log(self.level, 'outgoing frame: %s, %s, %s',
+                        session.id, frame, str(data)[:self.limit])
+
+    def on_close(self, session):
+        self.logger.log(self.level, 'session closed: %s', session.id)
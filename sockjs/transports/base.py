@@ -1,9 +1,18 @@
 import aiohttp
 import asyncio
+import logging
 
-from ..exceptions import SessionIsAcquired, SessionIsClosed
-from ..protocol import close_frame, ENCODING
-from ..protocol import STATE_CLOSING, STATE_CLOSED, FRAME_CLOSE, FRAME_MESSAGE
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
+
+from ..exceptions import SessionIsAcquired, SlowConsumer
+from ..protocol import close_frame, encode_frame, ENCODING
+from ..protocol import STATE_CLOSING, STATE_CLOSED, FRAME_CLOSE
+from .utils import write_buffers
+
+log = logging.getLogger('sockjs')
 
 
 class Transport:
@@ -16,25 +25,145 @@ class Transport:
 
 
 class StreamingTransport(Transport):
+    """Session sink, queued frames are written by ``flush()`` which
+    session manager calls for sessions with new frames."""
 
+    direct = False  # frames are always queued
     timeout = None
     maxsize = 131072  # 128K bytes
+    framing = 'line'  # cache key of encoded shared frames
+    polling = False  # response ends after first frame
+    high_water = 65536  # write buffer limits of connection
+    low_water = 16384
+    drain_timeout = 30.0  # slow consumer is closed after this many seconds
 
     def __init__(self, manager, session, request):
         super().__init__(manager, session, request)
 
         self.size = 0
         self.response = None
+        self.done = None  # result is close frame text or None
+        self._draining = None
+        self._timer = None
+
+    def encode(self, text):
+        return (text + '\n').encode(ENCODING)
+
+    def buffer_stats(self):
+        """Bytes buffered in userland and kernel for this connection."""
+        return write_buffers(self.request.transport)
+
+    @asyncio.coroutine
+    def drain(self):
+        """Wait for write buffer to drop to ``low_water`` if it is
+        above ``high_water``, False if client does not read it in
+        ``drain_timeout`` seconds."""
+        transport = self.request.transport
+        if transport.get_write_buffer_size() <= self.high_water:
+            return True
+        try:
+            yield from asyncio.wait_for(
+                self.response.drain(), self.drain_timeout, loop=self.loop)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @asyncio.coroutine
+    def evict(self):
+        """Close session of slow client and drop its connection."""
+        log.warning('slow consumer, closing session: %s', self.session.id)
+        metrics = self.manager.metrics
+        if metrics is not None:
+            metrics.slow_consumers += 1
+        yield from self.session._remote_close(exc=SlowConsumer())
+        yield from self.session._remote_closed()
+        self.request.transport.abort()
+
+    def framed(self, text):
+        """Frame text encoded for this transport."""
+        return encode_frame(text, self.framing, self.encode)
 
     def send(self, text):
-        blob = (text + '\n').encode(ENCODING)
+        blob = self.framed(text)
         self.response.write(blob)
 
         self.size += len(blob)
-        if self.size > self.maxsize:
-            return True
+        return self.polling or self.size > self.maxsize
+
+    def send_queued(self, text):
+        """Write ``text`` and frames queued after it with one write,
+        until ``maxsize`` is reached or close frame is next. Returns
+        True if response has to be ended."""
+        session = self.session
+        blobs = [self.framed(text)]
+        self.size += len(blobs[0])
+        stop = self.polling or self.size > self.maxsize
+
+        while not stop and session._queue and (
+                session._queue[0][0] != FRAME_CLOSE):
+            frame, text = session._take()
+            blob = self.framed(text)
+            blobs.append(blob)
+            self.size += len(blob)
+            stop = self.size > self.maxsize
+
+        if len(blobs) == 1:
+            self.response.write(blobs[0])
         else:
-            return False
+            self.response.write(b''.join(blobs))
+        return stop
+
+    def flush(self, session):
+        """Write queued frames, called by session manager."""
+        done = self.done
+        if done.done() or self._draining is not None:
+            return
+
+        queue = session._queue
+        if queue and queue[0][0] != FRAME_CLOSE:
+            frame, text = session._take()
+            if self.send_queued(text):
+                done.set_result(None)
+                return
+
+        if session._queue:
+            # close frame is sent after session is closed
+            frame, text = session._take()
+            done.set_result(text)
+        elif session.state == STATE_CLOSED:
+            done.set_result(None)
+        elif self.request.transport.get_write_buffer_size() > self.high_water:
+            self._draining = ensure_future(self._resume(), loop=self.loop)
+        else:
+            self._arm()
+
+    @asyncio.coroutine
+    def _resume(self):
+        try:
+            drained = yield from self.drain()
+        finally:
+            self._draining = None
+
+        if self.done.done():
+            return
+        if not drained:
+            self.done.set_exception(SlowConsumer())
+        elif self.session._sink is self:
+            self.flush(self.session)
+
+    def _arm(self):
+        if self.timeout:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self.loop.call_later(self.timeout, self._timed_out)
+
+    def _timed_out(self):
+        self._timer = None
+        if not self.done.done():
+            if self.send('a[]'):
+                self.done.set_result(None)
+            else:
+                self._arm()
 
     @asyncio.coroutine
     def handle_session(self):
@@ -52,36 +181,38 @@ class StreamingTransport(Transport):
         else:
             # acquire session
             try:
-                yield from self.manager.acquire(self.session)
+                yield from self.manager.acquire(
+                    self.session, polling=self.polling)
             except SessionIsAcquired:
                 self.send(close_frame(2010, 'Another connection still open'))
             else:
+                sid = self.session.id
+                self.manager.streams[sid] = self
+                self.request.transport.set_write_buffer_limits(
+                    high=self.high_water, low=self.low_water)
+                self.done = asyncio.Future(loop=self.loop)
+                self.session._sink = self
                 try:
-                    while True:
-                        if self.timeout:
-                            try:
-                                frame, text = yield from asyncio.wait_for(
-                                    self.session._wait(),
-                                    timeout=self.timeout, loop=self.loop)
-                            except asyncio.futures.TimeoutError:
-                                frame, text = FRAME_MESSAGE, 'a[]'
-                        else:
-                            frame, text = yield from self.session._wait()
-
-                        if frame == FRAME_CLOSE:
-                            yield from self.session._remote_closed()
-                            self.send(text)
-                            return
-                        else:
-                            stop = self.send(text)
-                            if stop:
-                                break
+                    self._arm()
+                    self.flush(self.session)
+                    text = yield from self.done
+                    if text is not None:
+                        yield from self.session._remote_closed()
+                        self.send(text)
+                except SlowConsumer:
+                    yield from self.evict()
                 except asyncio.CancelledError:
                     yield from self.session._remote_close(
                         exc=aiohttp.ClientConnectionError)
                     yield from self.session._remote_closed()
                     raise
-                except SessionIsClosed:
-                    pass
                 finally:
+                    self.session._sink = None
+                    if self._timer is not None:
+                        self._timer.cancel()
+                        self._timer = None
+                    if self._draining is not None:
+                        self._draining.cancel()
+                    if self.manager.streams.get(sid) is self:
+                        del self.manager.streams[sid]
                     yield from self.manager.release(self.session)
@@ -9,15 +9,10 @@ from .utils import session_cookie
 
 class EventsourceTransport(StreamingTransport):
 
-    def send(self, text):
-        blob = ''.join(('data: ', text, '\r\n\r\n')).encode(ENCODING)
-        self.response.write(blob)
-
-        self.size += len(blob)
-        if self.size > self.maxsize:
-            return True
-        else:
-            return False
+    framing = 'eventsource'
+
+    def encode(self, text):
+        return ''.join(('data: ', text, '\r\n\r\n')).encode(ENCODING)
 
     @asyncio.coroutine
     def process(self):
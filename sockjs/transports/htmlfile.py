@@ -3,7 +3,7 @@ import asyncio
 import re
 from aiohttp import web, hdrs
 
-from ..protocol import dumps, ENCODING
+from ..protocol import dumps, encode_frame, ENCODING
 from .base import StreamingTransport
 from .utils import session_cookie, cors_headers
 
@@ -28,18 +28,12 @@ PRELUDE2 = b""";
 class HTMLFileTransport(StreamingTransport):
 
     maxsize = 131072  # 128K bytes
+    framing = 'htmlfile'
     check_callback = re.compile('^[a-zA-Z0-9_\.]+$')
 
-    def send(self, text):
-        blob = (
-            '<script>\np(%s);\n</script>\r\n' % dumps(text)).encode(ENCODING)
-        self.response.write(blob)
-
-        self.size += len(blob)
-        if self.size > self.maxsize:
-            return True
-        else:
-            return False
+    def encode(self, text):
+        return ('<script>\np(%s);\n</script>\r\n' % (
+            encode_frame(text, 'json', dumps),)).encode(ENCODING)
 
     @asyncio.coroutine
     def process(self):
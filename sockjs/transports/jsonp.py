@@ -7,18 +7,20 @@ from aiohttp import web, hdrs
 
 from .base import StreamingTransport
 from .utils import session_cookie, cors_headers
-from ..protocol import dumps, loads, ENCODING
+from ..protocol import dumps, loads, encode_frame, ENCODING
 
 
 class JSONPolling(StreamingTransport):
 
     check_callback = re.compile('^[a-zA-Z0-9_\.]+$')
     callback = ''
+    polling = True
 
-    def send(self, text):
-        data = '/**/%s(%s);\r\n' % (self.callback, dumps(text))
-        self.response.write(data.encode(ENCODING))
-        return True
+    def framed(self, text):
+        # callbacks are unique per client, only json text is shared
+        data = '/**/%s(%s);\r\n' % (
+            self.callback, encode_frame(text, 'json', dumps))
+        return data.encode(ENCODING)
 
     @asyncio.coroutine
     def process(self):
@@ -10,7 +10,14 @@ except ImportError:  # pragma: no cover
 from .base import Transport
 from ..exceptions import SessionIsClosed
 from ..protocol import FRAME_CLOSE, FRAME_MESSAGE, FRAME_MESSAGE_BLOB, \
-    FRAME_HEARTBEAT
+    FRAME_HEARTBEAT, encode_frame
+
+
+def raw_text(blob):
+    data = blob[1:]
+    if data.startswith('['):
+        data = data[1:-1]
+    return data
 
 
 class RawWebSocketTransport(Transport):
@@ -27,10 +34,7 @@ class RawWebSocketTransport(Transport):
                 for text in data:
                     ws.send_str(text)
             elif frame == FRAME_MESSAGE_BLOB:
-                data = data[1:]
-                if data.startswith('['):
-                    data = data[1:-1]
-                ws.send_str(data)
+                ws.send_str(encode_frame(data, 'raw', raw_text))
             elif frame == FRAME_HEARTBEAT:
                 ws.ping()
             elif frame == FRAME_CLOSE:
@@ -1,7 +1,15 @@
 import http.cookies
+import struct
 from aiohttp import hdrs
 from datetime import datetime, timedelta
 
+try:
+    import fcntl
+    import termios
+    TIOCOUTQ = termios.TIOCOUTQ  # same as SIOCOUTQ on linux
+except (ImportError, AttributeError):  # pragma: no cover
+    TIOCOUTQ = None
+
 
 def cors_headers(headers, nocreds=False):
     origin = headers.get(hdrs.ORIGIN, '*')
@@ -27,6 +35,21 @@ def session_cookie(request):
     return ((hdrs.SET_COOKIE, cookies['JSESSIONID'].output(header='')[1:]),)
 
 
+def write_buffers(transport):
+    """Bytes waiting in userland write buffer of ``transport`` and in
+    kernel send queue of its socket, kernel size is None if unknown."""
+    userland = transport.get_write_buffer_size()
+    kernel = None
+    sock = transport.get_extra_info('socket')
+    if sock is not None and TIOCOUTQ is not None:
+        try:
+            kernel, = struct.unpack(
+                'i', fcntl.ioctl(sock.fileno(), TIOCOUTQ, b'\0' * 4))
+        except (OSError, ValueError):
+            pass
+    return userland, kernel
+
+
 td365 = timedelta(days=365)
 td365seconds = str(
     int((td365.microseconds +
@@ -8,28 +8,40 @@ except ImportError:  # pragma: no cover
     ensure_future = asyncio.async
 
 from .base import Transport
-from ..exceptions import SessionIsClosed
 from ..protocol import STATE_CLOSED, FRAME_CLOSE
 from ..protocol import loads, close_frame
 
 
 class WebSocketTransport(Transport):
-
-    @asyncio.coroutine
-    def server(self, ws, session):
-        while True:
-            try:
-                frame, data = yield from session._wait()
-            except SessionIsClosed:
-                break
-
-            ws.send_str(data)
-
+    """Session sink, see ``StreamingTransport``."""
+
+    direct = True  # write frames of idle session without queue
+    high_water = 65536  # frames are queued while more bytes are buffered
+
+    def write_direct(self, text):
+        """Write frame to websocket, False if connection is busy."""
+        if self.ws.closed or (
+                self.request.transport.get_write_buffer_size() >
+                self.high_water):
+            return False
+        self.ws.send_str(text)
+        return True
+
+    def flush(self, session):
+        """Write queued frames, close frame closes websocket."""
+        if self.ws.closed or self.done.done():
+            return
+
+        while session._queue:
+            frame, text = session._take()
+            self.ws.send_str(text)
             if frame == FRAME_CLOSE:
-                try:
-                    yield from ws.close()
-                finally:
-                    yield from session._remote_closed()
+                session._sink = None
+                self.done.set_result(True)
+                return
+
+        if session.state == STATE_CLOSED:
+            self.done.set_result(False)
 
     @asyncio.coroutine
     def client(self, ws, session):
@@ -59,6 +71,9 @@ class WebSocketTransport(Transport):
             elif msg.tp == web.MsgType.closed:
                 yield from session._remote_closed()
                 break
+            elif msg.tp == web.MsgType.closing:
+                # server closes websocket after close frame
+                break
 
     @asyncio.coroutine
     def process(self):
@@ -81,23 +96,33 @@ class WebSocketTransport(Transport):
                 yield from ws.close()
                 return ws
 
-            server = ensure_future(
-                self.server(ws, self.session), loop=self.loop)
+            # direct writes would not wait for flush delay
+            self.direct = self.direct and self.manager.flush_delay is None
+            self.done = asyncio.Future(loop=self.loop)
+            self.session._sink = self
+            self.flush(self.session)
+
             client = ensure_future(
                 self.client(ws, self.session), loop=self.loop)
             try:
                 yield from asyncio.wait(
-                    (server, client),
+                    (self.done, client),
                     loop=self.loop,
                     return_when=asyncio.FIRST_COMPLETED)
+
+                # close frame was sent
+                if self.done.done() and self.done.result():
+                    try:
+                        yield from ws.close()
+                    finally:
+                        yield from self.session._remote_closed()
             except asyncio.CancelledError:
                 raise
             except Exception as exc:
                 yield from self.session._remote_close(exc)
             finally:
+                self.session._sink = None
                 yield from self.manager.release(self.session)
-                if not server.done():
-                    server.cancel()
                 if not client.done():
                     client.cancel()
 
@@ -10,6 +10,7 @@ class XHRTransport(StreamingTransport):
     used for XHRPolling and JSONPolling."""
 
     maxsize = 0
+    polling = True
 
     @asyncio.coroutine
     def process(self):
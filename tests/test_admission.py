@@ -0,0 +1,138 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from sockjs import SessionManager, SessionRejected
+from sockjs.admission import Admission, REJECT_BODY
+from sockjs.metrics import format_metrics
+from sockjs.store import FORWARDED, FORWARDED_FOR
+
+
+def test_max_sessions(app, loop, make_handler):
+    admission = Admission(max_sessions=2)
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        admission=admission)
+    sm.get('s1', True)
+    sm.get('s2', True)
+    with pytest.raises(SessionRejected) as exc:
+        sm.get('s3', True)
+    assert exc.value.reason == 'sessions'
+    assert 's3' not in sm
+
+    # existing sessions are not checked
+    assert sm.get('s1', True) is sm['s1']
+    assert admission.rejected == {'sessions': 1}
+
+
+def test_rate(app, loop, make_handler):
+    admission = Admission(rate=1.0, burst=2)
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        admission=admission)
+    sm._clock = mock.Mock()
+    sm._clock.time.return_value = 100.0
+
+    sm.get('s1', True)
+    sm.get('s2', True)
+    with pytest.raises(SessionRejected):
+        sm.get('s3', True)
+
+    sm._clock.time.return_value = 101.0
+    sm.get('s3', True)
+    assert admission.rejected == {'rate': 1}
+
+
+def test_default_burst(app, loop, make_handler):
+    admission = Admission(rate=0.5)
+    assert admission.burst == 1.0
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        admission=admission)
+    sm.get('s1', True)
+    with pytest.raises(SessionRejected):
+        sm.get('s2', True)
+
+
+def test_rejected_caps_keep_tokens(app, loop, make_handler):
+    admission = Admission(max_sessions=1, rate=1.0, burst=2)
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        admission=admission)
+    sm.get('s1', True)
+    with pytest.raises(SessionRejected):
+        sm.get('s2', True)
+    assert admission._tokens == 1.0
+
+
+@asyncio.coroutine
+def test_max_per_client(app, loop, make_handler, make_request):
+    admission = Admission(max_per_client=1)
+    admission.client = lambda request: request.headers['X-Client']
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        admission=admission)
+
+    def request(client):
+        return make_request('GET', '/', headers={'X-Client': client})
+
+    s1 = sm.get('s1', True, request=request('a'))
+    sm.get('s2', True, request=request('b'))
+    with pytest.raises(SessionRejected) as exc:
+        sm.get('s3', True, request=request('a'))
+    assert exc.value.reason == 'client'
+
+    s1._tick(-30.0)
+    yield from sm._gc_task()
+    assert 's1' not in sm
+    sm.get('s3', True, request=request('a'))
+    assert dict(admission._clients) == {'a': 1, 'b': 1}
+
+
+def test_client(make_request):
+    request = make_request('GET', '/')
+    request.transport.get_extra_info = mock.Mock(
+        return_value=('10.0.0.1', 4000))
+    assert Admission().client(request) == '10.0.0.1'
+
+
+def test_forwarded_client(make_request):
+    headers = {FORWARDED: '1', FORWARDED_FOR: '10.0.0.2'}
+    request = make_request('GET', '/', headers=headers)
+
+    # proxied by worker over unix socket
+    request.transport.get_extra_info = mock.Mock(return_value='')
+    assert Admission().client(request) == '10.0.0.2'
+
+    # header of a client connection is not trusted
+    request.transport.get_extra_info = mock.Mock(
+        return_value=('10.0.0.1', 4000))
+    assert Admission().client(request) == '10.0.0.1'
+
+
+@asyncio.coroutine
+def test_route_rejection(make_route, make_request):
+    route = make_route()
+    route.manager.admission = Admission(max_sessions=1)
+    route.manager['s0'] = mock.Mock()
+
+    request = make_request('GET', '/sm/')
+    request.match_info.update(
+        {'server': '000', 'session': 's1', 'transport': 'xhr_streaming'})
+    resp = yield from route.handler(request)
+    assert resp.status == 503
+    assert resp.body == REJECT_BODY
+    assert resp.headers['Retry-After'] == '5'
+    assert 's1' not in route.manager
+
+    resp = yield from route.websocket(make_request('GET', '/sm/'))
+    assert resp.status == 503
+    route.manager.stop()
+
+
+def test_rejected_metrics(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True,
+                        admission=Admission(max_sessions=1))
+    sm.get('s1', True)
+    with pytest.raises(SessionRejected):
+        sm.get('s2', True)
+
+    lines = format_metrics(sm.metrics.collect(sm)).splitlines()
+    assert ('sockjs_sessions_rejected_total'
+            '{endpoint="sm",reason="sessions"} 1') in lines
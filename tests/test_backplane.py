@@ -0,0 +1,116 @@
+import asyncio
+from unittest import mock
+
+from sockjs import SessionManager, protocol
+from sockjs.backplane import Backplane, LocalBackplane
+from sockjs.backplane import UnixSocketBackplane, UnixSocketHub
+
+
+def make_managers(app, loop, make_handler, backplane, count=2):
+    managers = []
+    for idx in range(count):
+        sm = SessionManager(
+            'sm', app, make_handler([]), loop=loop, backplane=backplane)
+        s = sm.get('s%d' % idx, True)
+        s.state = protocol.STATE_OPEN
+        sm.subscribe(s, 'room')
+        sm.start()
+        managers.append((sm, s))
+    return managers
+
+
+@asyncio.coroutine
+def test_batching(loop):
+    backplane = Backplane(loop=loop)
+    backplane.send = mock.Mock()
+    manager = mock.Mock()
+
+    backplane.publish(manager, None, 'a["msg1"]')
+    backplane.publish(manager, 'room', 'a["msg2"]')
+    assert not backplane.send.called
+
+    yield from asyncio.sleep(0, loop=loop)
+    backplane.send.assert_called_once_with(
+        [(manager, None, 'a["msg1"]'), (manager, 'room', 'a["msg2"]')])
+
+
+def test_register(loop):
+    backplane = Backplane()
+    backplane.start = mock.Mock()
+    backplane.stop = mock.Mock()
+    manager = mock.Mock()
+    manager.name = 'sm'
+    manager.loop = loop
+
+    backplane.register(manager)
+    backplane.register(manager)
+    assert backplane.loop is loop
+    assert backplane._managers == {'sm': [manager]}
+    assert backplane.start.call_count == 1
+
+    backplane.unregister(manager)
+    assert backplane._managers == {}
+    assert backplane.stop.called
+
+
+@asyncio.coroutine
+def test_local_backplane(app, loop, make_handler):
+    backplane = LocalBackplane()
+    (sm1, s1), (sm2, s2) = make_managers(app, loop, make_handler, backplane)
+
+    sm1.broadcast('msg1')
+    sm2.publish('room', 'msg2')
+    yield from asyncio.sleep(0, loop=loop)
+
+    assert list(s1._queue) == [
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg1"]'),
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg2"]')]
+    assert list(s2._queue) == [
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg2"]'),
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg1"]')]
+
+    sm1.stop()
+    sm2.stop()
+
+
+@asyncio.coroutine
+def test_unix_socket_backplane(app, loop, make_handler, tmpdir):
+    path = str(tmpdir.join('hub.sock'))
+    hub = UnixSocketHub(path, loop=loop)
+    yield from hub.start()
+
+    bp1 = UnixSocketBackplane(path, loop=loop)
+    bp2 = UnixSocketBackplane(path, loop=loop)
+    (sm1, s1), = make_managers(app, loop, make_handler, bp1, 1)
+    (sm2, s2), = make_managers(app, loop, make_handler, bp2, 1)
+
+    for idx in range(100):
+        if bp1.connected and bp2.connected and len(hub._writers) == 2:
+            break
+        yield from asyncio.sleep(0.01, loop=loop)
+
+    sm1.broadcast('msg1')
+    sm1.publish('room', 'msg2')
+
+    for idx in range(100):
+        if s2._queued == 2:
+            break
+        yield from asyncio.sleep(0.01, loop=loop)
+
+    assert list(s2._queue) == [
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg1"]'),
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg2"]')]
+    assert s1._queued == 2
+    assert bp1.dropped == 0
+
+    sm1.stop()
+    sm2.stop()
+    yield from hub.stop()
+
+
+def test_unix_socket_backplane_not_connected(loop):
+    backplane = UnixSocketBackplane('/tmp/unknown.sock', loop=loop)
+    manager = mock.Mock()
+    manager.name = 'sm'
+    backplane.send([(manager, None, 'a["msg"]')])
+    assert backplane.dropped == 1
@@ -0,0 +1,48 @@
+from sockjs.clock import Clock, get_clock
+
+
+def test_get_clock(loop):
+    clock = get_clock(loop)
+    assert clock.loop is loop
+    assert get_clock(loop) is clock
+
+
+def test_time(mocker, loop):
+    clock = Clock(loop)
+    mocker.patch.object(loop, 'time', return_value=1000.0)
+
+    assert not clock.started
+    assert clock.time() == 1000.0
+
+
+def test_start_caches_time(mocker, loop):
+    clock = Clock(loop)
+    time = mocker.patch.object(loop, 'time', return_value=1000.0)
+
+    clock.start()
+    assert clock.started
+
+    time.return_value = 1001.0
+    assert clock.time() == 1000.0
+
+    clock._update()
+    assert clock.time() == 1001.0
+
+    clock.stop()
+    assert not clock.started
+    assert clock.time() == 1001.0
+
+
+def test_shared_start_stop(loop):
+    clock = Clock(loop)
+
+    clock.start()
+    clock.start()
+    clock.stop()
+    assert clock.started
+
+    clock.stop()
+    assert not clock.started
+
+    clock.stop()
+    assert not clock.started
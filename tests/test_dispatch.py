@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from sockjs import SessionManager, protocol
+from sockjs.dispatch import Dispatcher
+
+
+def make_blocking_handler(loop):
+    """Handler waits for ``release(msg)``, records started and
+    finished messages."""
+    events = {}
+    started, finished = [], []
+
+    def event(msg):
+        if msg not in events:
+            events[msg] = asyncio.Event(loop=loop)
+        return events[msg]
+
+    @asyncio.coroutine
+    def handler(msg, session):
+        if msg.tp != protocol.MSG_MESSAGE:
+            return
+        started.append(msg.data)
+        yield from event(msg.data).wait()
+        finished.append(msg.data)
+        if msg.data == 'error':
+            raise ValueError()
+
+    handler.release = lambda msg: event(msg).set()
+    handler.started = started
+    handler.finished = finished
+    return handler
+
+
+def make_sessions(app, loop, handler, dispatcher, count=1):
+    sm = SessionManager('sm', app, handler, loop, dispatcher=dispatcher)
+    sessions = []
+    for idx in range(count):
+        s = sm.get('s%d' % idx, True)
+        s.state = protocol.STATE_OPEN
+        sessions.append(s)
+    return sm, sessions
+
+
+def test_limit():
+    with pytest.raises(ValueError):
+        Dispatcher(0)
+
+
+@asyncio.coroutine
+def test_concurrency(app, loop):
+    handler = make_blocking_handler(loop)
+    dispatcher = Dispatcher(2, loop=loop)
+    sm, (s,) = make_sessions(app, loop, handler, dispatcher)
+
+    yield from s._remote_messages(['msg1', 'msg2'])
+    yield from asyncio.sleep(0, loop=loop)
+    assert handler.started == ['msg1', 'msg2']
+    assert dispatcher.running == 2
+
+    third = asyncio.async(s._remote_message('msg3'), loop=loop)
+    yield from asyncio.sleep(0, loop=loop)
+    assert not third.done()
+
+    handler.release('msg2')
+    yield from third
+    yield from asyncio.sleep(0, loop=loop)
+    assert handler.started == ['msg1', 'msg2', 'msg3']
+
+    handler.release('msg1')
+    handler.release('msg3')
+    yield from dispatcher.join(s)
+    assert handler.finished == ['msg2', 'msg1', 'msg3']
+    assert dispatcher.running == 0
+    assert not dispatcher._sessions
+
+
+@asyncio.coroutine
+def test_ordering_key(app, loop):
+    handler = make_blocking_handler(loop)
+    dispatcher = Dispatcher(4, ordering_key=lambda msg: msg[0], loop=loop)
+    sm, (s,) = make_sessions(app, loop, handler, dispatcher)
+
+    yield from s._remote_messages(['a1', 'b1', 'a2'])
+    yield from asyncio.sleep(0, loop=loop)
+    assert handler.started == ['a1', 'b1']
+
+    handler.release('a2')
+    handler.release('b1')
+    yield from asyncio.sleep(0, loop=loop)
+    assert handler.started == ['a1', 'b1']
+
+    handler.release('a1')
+    yield from dispatcher.join(s)
+    assert handler.finished == ['b1', 'a1', 'a2']
+    assert not dispatcher._sessions
+
+
+@asyncio.coroutine
+def test_global_limit(app, loop):
+    handler = make_blocking_handler(loop)
+    dispatcher = Dispatcher(2, global_limit=2, loop=loop)
+    sm, (s1, s2) = make_sessions(app, loop, handler, dispatcher, 2)
+
+    yield from s1._remote_messages(['msg1', 'msg2'])
+    pending = asyncio.async(s2._remote_message('msg3'), loop=loop)
+    yield from asyncio.sleep(0, loop=loop)
+    assert not pending.done()
+
+    handler.release('msg1')
+    yield from pending
+    handler.release('msg2')
+    handler.release('msg3')
+    yield from dispatcher.join(s1)
+    yield from dispatcher.join(s2)
+    assert sorted(handler.finished) == ['msg1', 'msg2', 'msg3']
+
+
+@asyncio.coroutine
+def test_handler_exception(app, loop):
+    handler = make_blocking_handler(loop)
+    dispatcher = Dispatcher(1, loop=loop)
+    sm, (s,) = make_sessions(app, loop, handler, dispatcher)
+
+    handler.release('error')
+    handler.release('msg')
+    yield from s._remote_messages(['error', 'msg'])
+    yield from dispatcher.join(s)
+    assert handler.finished == ['error', 'msg']
+
+
+@asyncio.coroutine
+def test_close_after_messages(app, loop):
+    handler = make_blocking_handler(loop)
+    dispatcher = Dispatcher(1, loop=loop)
+    sm, (s,) = make_sessions(app, loop, handler, dispatcher)
+
+    yield from s._remote_message('msg')
+    closing = asyncio.async(s._remote_close(), loop=loop)
+    yield from asyncio.sleep(0, loop=loop)
+    assert not closing.done()
+
+    handler.release('msg')
+    yield from closing
+    assert handler.finished == ['msg']
+    assert s.state == protocol.STATE_CLOSING
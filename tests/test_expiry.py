@@ -0,0 +1,80 @@
+from sockjs.expiry import ExpiryWheel
+
+
+def test_touch(make_session):
+    wheel = ExpiryWheel()
+    s = make_session('test')
+
+    wheel.touch(s)
+    assert len(wheel) == 1
+    assert s in s._bucket
+
+    bucket = s._bucket
+    wheel.touch(s)
+    assert s._bucket is bucket
+    assert len(wheel) == 1
+
+
+def test_touch_moves_session(make_session):
+    wheel = ExpiryWheel()
+    s = make_session('test')
+    wheel.touch(s)
+    bucket = s._bucket
+
+    s.expires = s.expires + 5.0
+    wheel.touch(s)
+    assert s._bucket is not bucket
+    assert s not in bucket
+    assert len(wheel) == 1
+
+
+def test_discard(make_session):
+    wheel = ExpiryWheel()
+    s = make_session('test')
+    wheel.touch(s)
+
+    wheel.discard(s)
+    assert s._bucket is None
+    assert len(wheel) == 0
+
+    wheel.discard(s)
+    assert len(wheel) == 0
+
+
+def test_expired(make_session):
+    wheel = ExpiryWheel()
+    now = 1000.0
+
+    s1 = make_session('s1')
+    s1.expires = now - 30.0
+    s2 = make_session('s2')
+    s2.expires = now + 30.0
+    wheel.touch(s1)
+    wheel.touch(s2)
+
+    assert wheel.expired(now) == [s1]
+    assert s1._bucket is None
+    assert s2._bucket is not None
+    assert wheel.expired(now) == []
+
+    assert wheel.expired(now + 60.0) == [s2]
+    assert len(wheel) == 0
+
+
+def test_expired_keeps_current_bucket(make_session):
+    wheel = ExpiryWheel(resolution=10.0)
+    s = make_session('test')
+    wheel.touch(s)
+
+    assert wheel.expired(s.expires) == []
+    assert s._bucket is not None
+
+
+def test_clear(make_session):
+    wheel = ExpiryWheel()
+    s = make_session('test')
+    wheel.touch(s)
+
+    wheel.clear()
+    assert s._bucket is None
+    assert len(wheel) == 0
@@ -0,0 +1,212 @@
+import asyncio
+from unittest import mock
+
+import sockjs
+from sockjs import SessionManager, protocol
+from sockjs.metrics import Histogram, Metrics, format_metrics
+from sockjs.tracing import Tracer, Tracers
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    assert list(histogram.cumulative()) == [
+        (0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 5.65
+
+
+@asyncio.coroutine
+def test_session_metrics(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    metrics = sm.metrics
+    metrics.sample = 2
+    assert sm.tracer is metrics
+
+    s = sm.get('test', True)
+    yield from sm.acquire(s)
+    yield from s._remote_messages(['msg1', 'msg2'])
+    s.send('reply')
+    sm.broadcast('all')
+    s._heartbeat()
+    yield from s._remote_closed()
+
+    assert metrics.opened == 1
+    assert metrics.closed == 1
+    assert metrics.messages_in == 2
+    assert metrics.bytes_in == 8
+    assert metrics.frames_out == 4
+    assert metrics.messages_out == 1
+    assert metrics.bytes_out == len('reply') + len('a["all"]')
+    assert metrics.heartbeats == 1
+    assert metrics.handler.count == 1
+
+
+def test_heartbeat_metrics(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    sm._heartbeat()
+    sm.stop()
+    assert sm.metrics.heartbeat.count == 1
+
+
+@asyncio.coroutine
+def test_gc_metrics(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    yield from sm._gc_task()
+    assert sm.metrics.gc.count == 1
+
+    lines = format_metrics(sm.metrics.collect(sm)).splitlines()
+    assert 'sockjs_gc_seconds_count{endpoint="sm"} 1' in lines
+
+
+@asyncio.coroutine
+def test_skipped_heartbeats(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        metrics=True, heartbeat_slots=1)
+    s1 = sm.get('s1', True)
+    s2 = sm.get('s2', True)
+    s3 = sm.get('s3', True)
+    yield from sm.acquire(s1, polling=True)
+    yield from sm.acquire(s2)
+    yield from sm.acquire(s3)
+    s1.send('msg')
+    s2.send('msg')
+
+    sm._heartbeat()
+    sm.stop()
+    assert sm.metrics.heartbeats == 1
+    assert sm.metrics.heartbeats_skipped == 2
+    assert sm.metrics.polls_saved == 1
+
+
+def test_metrics_with_tracer(app, loop, make_handler):
+    tracer = Tracer()
+    sm = SessionManager('sm', app, make_handler([]), loop,
+                        tracer=tracer, metrics=True)
+    assert isinstance(sm.tracer, Tracers)
+    assert sm.tracer.tracers == (tracer, sm.metrics)
+
+
+def test_collect(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    s = sm.get('test', True)
+    s.state = protocol.STATE_OPEN
+    s.send('msg')
+    sm.metrics.requests['xhr'] += 1
+
+    text = format_metrics(sm.metrics.collect(sm))
+    lines = text.splitlines()
+    assert '# TYPE sockjs_sessions gauge' in lines
+    assert 'sockjs_sessions{endpoint="sm",state="open"} 1' in lines
+    assert 'sockjs_queued_messages{endpoint="sm"} 1' in lines
+    assert 'sockjs_queued_bytes{endpoint="sm"} 3' in lines
+    assert ('sockjs_transport_requests_total'
+            '{endpoint="sm",transport="xhr"} 1') in lines
+    assert '# TYPE sockjs_handler_seconds histogram' in lines
+    assert 'sockjs_handler_seconds_bucket{endpoint="sm",le="+Inf"} 0' in lines
+    assert 'sockjs_heartbeat_seconds_count{endpoint="sm"} 0' in lines
+
+
+@asyncio.coroutine
+def test_metrics_route(app, make_handler, make_request):
+    sockjs.add_endpoint(app, make_handler([]), name='sm', metrics=True)
+    manager = sockjs.get_manager('sm', app)
+    assert isinstance(manager.metrics, Metrics)
+
+    route, = app.router['sockjs-metrics-sm']
+    resp = yield from route.handler(make_request('GET', '/sockjs/metrics'))
+    assert resp.content_type == 'text/plain'
+    assert 'sockjs_sessions_acquired{endpoint="sm"} 0' in resp.text
+    manager.stop()
+
+
+def test_no_metrics_route(app, make_handler):
+    sockjs.add_endpoint(app, make_handler([]), name='sm')
+    assert 'sockjs-metrics-sm' not in app.router
+    sockjs.get_manager('sm', app).stop()
+
+
+@asyncio.coroutine
+def test_transport_metrics(make_route, make_request, make_fut):
+    route = make_route()
+    route.manager.metrics = Metrics()
+    transport = mock.Mock()
+    transport.return_value.process = make_fut('response')
+    route.handlers = {'xhr': (True, transport)}
+
+    request = make_request('POST', '/sm/')
+    request.match_info.update(
+        {'server': '000', 'session': 's1', 'transport': 'xhr'})
+    assert (yield from route.handler(request)) == 'response'
+    assert route.manager.metrics.requests == {'xhr': 1}
+    assert route.manager.metrics.active == {'xhr': 0}
+    route.manager.stop()
+
+
+@asyncio.coroutine
+def test_transport_traffic(make_route, make_request, make_fut):
+    route = make_route()
+    metrics = route.manager.metrics = Metrics()
+    transport = mock.Mock()
+    transport.return_value.process = make_fut('response')
+    route.handlers = {'xhr': (True, transport),
+                      'xhr_send': (False, transport)}
+
+    request = make_request('POST', '/sm/')
+    request.match_info.update(
+        {'server': '000', 'session': 's1', 'transport': 'xhr'})
+    yield from route.handler(request)
+    session = route.manager['s1']
+    assert session._traffic is metrics.transports['xhr']
+
+    request = make_request('POST', '/sm/')
+    request.match_info.update(
+        {'server': '000', 'session': 's1', 'transport': 'xhr_send'})
+    yield from route.handler(request)
+    assert session._traffic is metrics.transports['xhr']
+    assert 'xhr_send' not in metrics.transports
+    route.manager.stop()
+
+
+def test_collect_transport_traffic(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    s1 = sm.get('s1', True)
+    s1._traffic = sm.metrics.traffic('xhr')
+    s2 = sm.get('s2', True)
+
+    sm.metrics.on_message_in(s1, 'msg')
+    sm.metrics.on_frame_out(s1, protocol.FRAME_MESSAGE, 'a["msg"]')
+    sm.metrics.on_frame_out(s2, protocol.FRAME_HEARTBEAT, 'h')
+    assert sm.metrics.messages_in == 1
+    assert sm.metrics.frames_out == 2
+    assert sm.metrics.bytes_out == 8
+    assert sm.metrics.heartbeats == 1
+
+    lines = format_metrics(sm.metrics.collect(sm)).splitlines()
+    assert ('sockjs_transport_messages_in_total'
+            '{endpoint="sm",transport="xhr"} 1') in lines
+    assert ('sockjs_transport_bytes_in_total'
+            '{endpoint="sm",transport="xhr"} 3') in lines
+    assert ('sockjs_transport_frames_out_total'
+            '{endpoint="sm",transport="xhr"} 1') in lines
+    assert ('sockjs_transport_bytes_out_total'
+            '{endpoint="sm",transport="xhr"} 8') in lines
+
+
+def test_collect_write_buffers(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, metrics=True)
+    sm.streams['s1'] = mock.Mock()
+    sm.streams['s1'].buffer_stats.return_value = (10, 5)
+    sm.streams['s2'] = mock.Mock()
+    sm.streams['s2'].buffer_stats.return_value = (7, None)
+    assert sm.buffer_stats() == {'s1': (10, 5), 's2': (7, None)}
+
+    lines = format_metrics(sm.metrics.collect(sm)).splitlines()
+    assert ('sockjs_write_buffer_bytes'
+            '{endpoint="sm",layer="userland"} 17') in lines
+    assert ('sockjs_write_buffer_bytes'
+            '{endpoint="sm",layer="kernel"} 5') in lines
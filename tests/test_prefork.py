@@ -0,0 +1,100 @@
+import asyncio
+import socket
+
+import aiohttp
+from aiohttp import web
+
+import sockjs
+from sockjs.prefork import PreforkServer
+from sockjs.prefork import recv_sockets, route_request, send_socket
+from sockjs.store import owner_of
+
+
+def server_of(owner, workers):
+    for idx in range(1000):
+        server = '%03d' % idx
+        if owner_of(server, workers) == owner:
+            return server
+
+
+def test_route_request():
+    server = server_of(1, 4)
+    head = ('POST /sockjs/%s/abc/xhr_send?t=1 HTTP/1.1\r\n'
+            'Host: localhost\r\n' % server).encode('ascii')
+    assert route_request(head, 4) == 1
+    assert route_request(head.replace(b'/abc/', b'/def/'), 4) == 1
+
+    assert route_request(b'GET /sockjs/info HTTP/1.1\r\n', 4) is None
+    assert route_request(b'GET /sockjs/websocket HTTP/1.1\r\n', 4) is None
+    assert route_request(b'GET /sockjs/1/2/unknown HTTP/1.1\r\n', 4) is None
+    assert route_request(b'GET /sockjs//2/xhr HTTP/1.1\r\n', 4) is None
+    assert route_request(b'GARBAGE\r\n', 4) is None
+    assert route_request(b'', 4) is None
+
+
+def test_send_socket():
+    parent, child = socket.socketpair()
+    conn1, conn2 = socket.socketpair()
+    try:
+        send_socket(parent, conn1)
+        sock, = recv_sockets(child)
+        conn1.close()
+
+        sock.sendall(b'ping')
+        assert conn2.recv(4) == b'ping'
+        sock.close()
+
+        parent.close()
+        assert recv_sockets(child) is None
+    finally:
+        conn2.close()
+        child.close()
+
+
+def make_app(loop, **options):
+    @asyncio.coroutine
+    def handler(msg, session):
+        if msg.tp == sockjs.MSG_MESSAGE:
+            session.send(msg.data)
+
+    app = web.Application(loop=loop)
+    sockjs.add_endpoint(app, handler, name='sm', prefix='/sm', **options)
+    return app
+
+
+def test_prefork_server(loop):
+    server = PreforkServer(
+        make_app, host='127.0.0.1', port=0, workers=2, loop=loop)
+    server.start()
+    port = server.sock.getsockname()[1]
+
+    @asyncio.coroutine
+    def roundtrip(client, sid, owner):
+        url = 'http://127.0.0.1:%d/sm/%s/%s/' % (
+            port, server_of(owner, 2), sid)
+
+        resp = yield from client.post(url + 'xhr')
+        assert (yield from resp.text()) == 'o\n'
+        resp = yield from client.post(url + 'xhr_send', data='["msg"]')
+        assert resp.status == 204
+        yield from resp.release()
+        resp = yield from client.post(url + 'xhr')
+        assert (yield from resp.text()) == 'a["msg"]\n'
+
+    @asyncio.coroutine
+    def run():
+        connector = aiohttp.TCPConnector(force_close=True, loop=loop)
+        client = aiohttp.ClientSession(connector=connector, loop=loop)
+        try:
+            resp = yield from client.get('http://127.0.0.1:%d/sm' % port)
+            assert (yield from resp.text()) == 'Welcome to SockJS!\n'
+
+            yield from roundtrip(client, 's1', 0)
+            yield from roundtrip(client, 's2', 1)
+        finally:
+            client.close()
+
+    try:
+        loop.run_until_complete(run())
+    finally:
+        server.stop()
@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 from sockjs import protocol
 
@@ -28,3 +29,25 @@ def test_message_frame():
 def test_messages_frame():
     msg = protocol.messages_frame(['msg1', 'msg2'])
     assert msg == 'a%s' % protocol.dumps(['msg1', 'msg2'])
+
+
+def test_shared_frame():
+    frame = protocol.SharedFrame(protocol.message_frame('msg1'))
+    assert frame == 'a["msg1"]'
+    assert frame.encoded == {}
+
+
+def test_encode_frame():
+    encoder = mock.Mock(return_value=b'data')
+    assert protocol.encode_frame('a["msg1"]', 'key', encoder) == b'data'
+    assert protocol.encode_frame('a["msg1"]', 'key', encoder) == b'data'
+    assert encoder.call_count == 2
+
+
+def test_encode_shared_frame():
+    frame = protocol.SharedFrame('a["msg1"]')
+    encoder = mock.Mock(return_value=b'data')
+    assert protocol.encode_frame(frame, 'key', encoder) == b'data'
+    assert protocol.encode_frame(frame, 'key', encoder) == b'data'
+    assert encoder.call_count == 1
+    assert frame.encoded == {'key': b'data'}
@@ -1,9 +1,12 @@
 import asyncio
 
+import pytest
 from aiohttp import web
 from multidict import CIMultiDict
 
+import sockjs
 from sockjs import protocol
+from sockjs.threadpool import ThreadPoolHandler
 
 
 def test_info(make_route, make_request):
@@ -233,3 +236,31 @@ def test_raw_websocket_fail(make_route, make_request):
     request = make_request('GET', '/sm/')
     res = yield from route.websocket(request)
     assert not isinstance(res, web.HTTPNotFound)
+
+
+def test_add_endpoint_options(app, make_handler):
+    sockjs.add_endpoint(
+        app, make_handler([]), name='sm', max_queue_frames=10)
+
+    manager = sockjs.get_manager('sm', app)
+    assert manager.max_queue_frames == 10
+    manager.stop()
+
+
+def test_add_endpoint_options_with_manager(app, make_handler, loop):
+    handler = make_handler([])
+    sm = sockjs.SessionManager('sm', app, handler, loop=loop)
+    with pytest.raises(ValueError):
+        sockjs.add_endpoint(
+            app, handler, name='sm', manager=sm, max_queue_frames=10)
+
+
+def test_add_endpoint_threads(app, make_handler):
+    sockjs.add_endpoint(
+        app, make_handler([], coro=False), name='sm', threads=2)
+
+    manager = sockjs.get_manager('sm', app)
+    assert isinstance(manager.handler, ThreadPoolHandler)
+    assert manager.handler.max_workers == 2
+    manager.stop()
+    app.loop.run_until_complete(app.cleanup())
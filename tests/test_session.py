@@ -1,6 +1,6 @@
 import asyncio
 from unittest import mock
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 import pytest
 
@@ -10,30 +10,38 @@ except ImportError:
     ensure_future = asyncio.async
 
 from sockjs import Session, SessionIsClosed, protocol, SessionIsAcquired
+from sockjs import SessionManager
 
 
 class TestSession:
 
     def test_ctor(self, mocker, make_handler, loop):
-        dt = mocker.patch('sockjs.session.datetime')
-        now = dt.now.return_value = datetime.now()
+        mocker.patch.object(loop, 'time', return_value=1000.0)
 
         handler = make_handler([])
         session = Session('id', handler, loop=loop)
 
         assert session.id == 'id'
         assert not session.expired
-        assert session.expires == now + timedelta(seconds=10)
+        assert session.timeout == 10.0
+        assert session.expires == 1010.0
 
         assert session._hits == 0
         assert session._heartbeats == 0
         assert session.state == protocol.STATE_NEW
 
-        session = Session('id', handler, timeout=timedelta(seconds=15))
+        session = Session(
+            'id', handler, timeout=timedelta(seconds=15), loop=loop)
 
         assert session.id == 'id'
         assert not session.expired
-        assert session.expires == now + timedelta(seconds=15)
+        assert session.timeout == 15.0
+        assert session.expires == 1015.0
+
+    def test_slots(self, make_session):
+        session = make_session('test')
+        assert not hasattr(session, '__dict__')
+        assert session._queue == ()
 
     def test_str(self, make_session):
         session = make_session('test')
@@ -59,36 +67,44 @@ class TestSession:
         assert str(session) == \
             "id='test' connected acquired queue[1] hits=10 heartbeats=50"
 
-    def test_tick(self, mocker, make_session):
-        dt = mocker.patch('sockjs.session.datetime')
-        now = dt.now.return_value = datetime.now()
+    def test_tick(self, mocker, make_session, loop):
+        time = mocker.patch.object(loop, 'time', return_value=1000.0)
         session = make_session('test')
 
-        now = dt.now.return_value = now + timedelta(hours=1)
+        time.return_value = 4600.0
         session._tick()
-        assert session.expires == now + session.timeout
+        assert session.expires == 4600.0 + session.timeout
 
-    def test_tick_different_timeoutk(self, mocker, make_session):
-        dt = mocker.patch('sockjs.session.datetime')
-        now = dt.now.return_value = datetime.now()
+    def test_tick_different_timeoutk(self, mocker, make_session, loop):
+        time = mocker.patch.object(loop, 'time', return_value=1000.0)
         session = make_session('test', timeout=timedelta(seconds=20))
 
-        now = dt.now.return_value = now + timedelta(hours=1)
+        time.return_value = 4600.0
         session._tick()
-        assert session.expires == now + timedelta(seconds=20)
+        assert session.expires == 4620.0
 
-    def test_tick_custom(self, mocker, make_session):
-        dt = mocker.patch('sockjs.session.datetime')
-        now = dt.now.return_value = datetime.now()
+    def test_tick_custom(self, mocker, make_session, loop):
+        time = mocker.patch.object(loop, 'time', return_value=1000.0)
         session = make_session('test', timeout=timedelta(seconds=20))
 
-        now = dt.now.return_value = now + timedelta(hours=1)
-        session._tick(timedelta(seconds=30))
-        assert session.expires == now + timedelta(seconds=30)
-
-    def test_heartbeat(self, make_session):
+        time.return_value = 4600.0
+        session._tick(30.0)
+        assert session.expires == 4630.0
+
+    def test_tick_coarse_clock(self, mocker, make_session, loop):
+        session = make_session('test', timeout=20.0)
+        session._clock.start()
+        try:
+            time = mocker.patch.object(loop, 'time', return_value=1000.0)
+            session._tick()
+            assert not time.called
+            assert session.expires == session._clock.time() + 20.0
+        finally:
+            session._clock.stop()
+
+    def test_heartbeat(self, mocker, make_session):
         session = make_session('test')
-        session._tick = mock.Mock()
+        mocker.patch.object(Session, '_tick')
         assert session._heartbeats == 0
 
         session._heartbeat()
@@ -104,6 +120,23 @@ class TestSession:
         assert list(session._queue) == \
             [(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)]
 
+    def test_heartbeat_no_transport(self, make_session):
+        session = make_session('test')
+        assert not session._heartbeat()
+        assert session._queue == ()
+
+    def test_heartbeat_recent_traffic(self, make_session):
+        session = make_session('test')
+        session._heartbeat_transport = True
+        session.state = protocol.STATE_OPEN
+        session.send('msg')
+        since = session._last_out
+
+        assert not session._heartbeat(since - 1.0)
+        assert len(session._queue) == 1
+        assert session._heartbeat(since)
+        assert len(session._queue) == 2
+
     def test_expire(self, make_session):
         session = make_session('test')
         assert not session.expired
@@ -111,12 +144,12 @@ class TestSession:
         session.expire()
         assert session.expired
 
-    def test_send(self, make_session):
+    def test_send(self, mocker, make_session):
         session = make_session('test')
         session.send('message')
         assert list(session._queue) == []
 
-        session._tick = mock.Mock()
+        mocker.patch.object(Session, '_tick')
         session.state = protocol.STATE_OPEN
         session.send('message')
 
@@ -129,12 +162,12 @@ class TestSession:
         with pytest.raises(AssertionError):
             session.send(b'str')
 
-    def test_send_frame(self, make_session):
+    def test_send_frame(self, mocker, make_session):
         session = make_session('test')
         session.send_frame('a["message"]')
         assert list(session._queue) == []
 
-        session._tick = mock.Mock()
+        mocker.patch.object(Session, '_tick')
         session.state = protocol.STATE_OPEN
         session.send_frame('a["message"]')
 
@@ -165,6 +198,48 @@ class TestSession:
              (protocol.FRAME_CLOSE, (3001, 'reason')),
              (protocol.FRAME_MESSAGE, ['msg3'])]
 
+    def test_feed_sink(self, make_session):
+        session = make_session('test')
+        written = []
+        session._sink = sink = mock.Mock(direct=True)
+        sink.write_direct = lambda text: written.append(text) or True
+
+        session._feed(protocol.FRAME_MESSAGE, 'msg')
+        session._feed(protocol.FRAME_MESSAGE_BLOB, 'a["blob"]')
+        session._feed(protocol.FRAME_CLOSE, (3000, 'Go away!'))
+        session._feed(protocol.FRAME_MESSAGE, 'msg2')
+
+        assert written == ['a["msg"]', 'a["blob"]']
+        assert list(session._queue) == [
+            (protocol.FRAME_CLOSE, (3000, 'Go away!')),
+            (protocol.FRAME_MESSAGE, ['msg2'])]
+        # sink is flushed by manager once for queued frames
+        sink.manager._mark_dirty.assert_called_once_with(session)
+
+    def test_feed_busy_sink(self, make_session):
+        session = make_session('test')
+        session._sink = sink = mock.Mock(direct=True)
+        sink.write_direct.return_value = False
+        session._feed(protocol.FRAME_MESSAGE, 'msg')
+        assert list(session._queue) == [(protocol.FRAME_MESSAGE, ['msg'])]
+        sink.manager._mark_dirty.assert_called_once_with(session)
+
+    def test_feed_queued_sink(self, make_session):
+        session = make_session('test')
+        session._sink = sink = mock.Mock(direct=False)
+        session._feed(protocol.FRAME_MESSAGE, 'msg')
+        assert not sink.write_direct.called
+        assert list(session._queue) == [(protocol.FRAME_MESSAGE, ['msg'])]
+        sink.manager._mark_dirty.assert_called_once_with(session)
+
+    @asyncio.coroutine
+    def test_release_sink(self, make_session):
+        session = make_session('test')
+        yield from session._acquire(mock.Mock())
+        session._sink = mock.Mock()
+        session._release()
+        assert session._sink is None
+
     def test_feed_with_waiter(self, make_session, loop):
         session = make_session('test')
         session._waiter = waiter = asyncio.Future(loop=loop)
@@ -189,6 +264,167 @@ class TestSession:
         assert frame == protocol.FRAME_MESSAGE
         assert payload == 'a["msg1"]'
 
+    @asyncio.coroutine
+    def test_wait_flush_delay(self, app, loop, make_handler):
+        for delay, expected in ((None, 'a["msg1"]'),
+                                (0.01, 'a["msg1","msg2"]')):
+            sm = SessionManager('sm', app, make_handler([]), loop,
+                                flush_delay=delay)
+            s = sm.get('test', True)
+            s.state = protocol.STATE_OPEN
+
+            waiter = ensure_future(s._wait(), loop=loop)
+            yield from asyncio.sleep(0, loop=loop)
+            s.send('msg1')
+            yield from asyncio.sleep(0.001, loop=loop)
+            s.send('msg2')
+
+            frame, payload = yield from waiter
+            assert payload == expected
+
+    @asyncio.coroutine
+    def test_wait_flush_next_iteration(self, app, loop, make_handler):
+        sm = SessionManager('sm', app, make_handler([]), loop,
+                            flush_delay=0)
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+
+        @asyncio.coroutine
+        def handle():
+            s.send('msg1')
+            yield from asyncio.sleep(0, loop=loop)
+            s.send('msg2')
+
+        waiter = ensure_future(s._wait(), loop=loop)
+        yield from asyncio.sleep(0, loop=loop)
+        yield from handle()
+        frame, payload = yield from waiter
+        assert payload == 'a["msg1","msg2"]'
+
+    @asyncio.coroutine
+    def test_flush_dirty_sessions(self, app, loop, make_handler):
+        sm = SessionManager('sm', app, make_handler([]), loop)
+        sink = mock.Mock(direct=False, manager=sm)
+        s1 = sm.get('s1', True)
+        s2 = sm.get('s2', True)
+        s1._sink = s2._sink = sink
+        s1.state = s2.state = protocol.STATE_OPEN
+
+        s1.send('msg1')
+        s1.send('msg2')
+        s2.send('msg3')
+        assert sm._dirty == {s1, s2}
+        assert not sink.flush.called
+
+        yield from asyncio.sleep(0, loop=loop)
+        assert sm._dirty == set()
+        assert sm._flush_handle is None
+        assert sorted(c[0][0].id for c in sink.flush.call_args_list) == [
+            's1', 's2']
+
+    @asyncio.coroutine
+    def test_flush_delay_sink(self, app, loop, make_handler):
+        sm = SessionManager('sm', app, make_handler([]), loop,
+                            flush_delay=0.01)
+        sink = mock.Mock(direct=False, manager=sm)
+        s = sm.get('s1', True)
+        s.state = protocol.STATE_OPEN
+        s._sink = sink
+
+        s.send('msg1')
+        yield from asyncio.sleep(0, loop=loop)
+        assert not sink.flush.called
+        yield from asyncio.sleep(0.02, loop=loop)
+        sink.flush.assert_called_once_with(s)
+
+    @asyncio.coroutine
+    def test_flush_error(self, app, loop, make_handler):
+        sm = SessionManager('sm', app, make_handler([]), loop)
+        s = sm.get('s1', True)
+        s.state = protocol.STATE_OPEN
+        s._sink = mock.Mock(direct=False, manager=sm)
+        s._sink.flush.side_effect = ValueError
+        s.send('msg1')
+        with mock.patch('sockjs.session.log') as log:
+            yield from asyncio.sleep(0, loop=loop)
+        assert log.exception.called
+
+        # sink removed before manager flushes
+        s._sink = None
+        sm._mark_dirty(s)
+        sm.stop()
+        assert sm._dirty == set()
+
+    @asyncio.coroutine
+    def test_wait_releases_queue(self, make_session):
+        s = make_session('test')
+        s.state = protocol.STATE_OPEN
+        s._feed(protocol.FRAME_MESSAGE, 'msg1')
+        s._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+
+        yield from s._wait()
+        assert len(s._queue) == 1
+        yield from s._wait()
+        assert s._queue == ()
+
+    @asyncio.coroutine
+    def test_wait_merges_blobs(self, make_session):
+        s = make_session('test')
+        s.state = protocol.STATE_OPEN
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a["b1"]')
+        s._feed(protocol.FRAME_MESSAGE, 'msg1')
+        s._feed(protocol.FRAME_MESSAGE, 'msg2')
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a["b2"]')
+        s._feed(protocol.FRAME_HEARTBEAT, protocol.FRAME_HEARTBEAT)
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a["b3"]')
+
+        frame, payload = yield from s._wait()
+        assert frame == protocol.FRAME_MESSAGE
+        assert payload == 'a["b1","msg1","msg2","b2"]'
+        assert s._queued == 1
+
+        frame, payload = yield from s._wait()
+        assert frame == protocol.FRAME_HEARTBEAT
+
+        frame, payload = yield from s._wait()
+        assert frame == protocol.FRAME_MESSAGE_BLOB
+        assert payload == 'a["b3"]'
+
+    @asyncio.coroutine
+    def test_wait_single_blob_is_not_copied(self, make_session):
+        s = make_session('test')
+        s.state = protocol.STATE_OPEN
+        blob = protocol.message_frame('msg')
+        s._feed(protocol.FRAME_MESSAGE_BLOB, blob)
+
+        frame, payload = yield from s._wait()
+        assert frame == protocol.FRAME_MESSAGE_BLOB
+        assert payload is blob
+
+    @asyncio.coroutine
+    def test_wait_does_not_merge_other_blobs(self, make_session):
+        s = make_session('test')
+        s.state = protocol.STATE_OPEN
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a[]')
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'custom')
+        s._feed(protocol.FRAME_MESSAGE, 'msg1')
+
+        frame, payload = yield from s._wait()
+        assert payload == 'a[]'
+        frame, payload = yield from s._wait()
+        assert payload == 'custom'
+
+    @asyncio.coroutine
+    def test_wait_merge_unpack(self, make_session):
+        s = make_session('test')
+        s.state = protocol.STATE_OPEN
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a["b1"]')
+        s._feed(protocol.FRAME_MESSAGE, 'msg1')
+
+        frame, payload = yield from s._wait(pack=False)
+        assert frame == protocol.FRAME_MESSAGE_BLOB
+        assert payload == 'a["b1"]'
+
     @asyncio.coroutine
     def test_wait_closed(self, make_session):
         s = make_session('test')
@@ -232,6 +468,86 @@ class TestSession:
         assert frame == protocol.FRAME_CLOSE
         assert payload == (3000, 'Go away!')
 
+    def test_queue_accounting(self, make_session):
+        s = make_session('test')
+        s._feed(protocol.FRAME_OPEN, protocol.FRAME_OPEN)
+        s._feed(protocol.FRAME_MESSAGE, 'msg1')
+        s._feed(protocol.FRAME_MESSAGE, 'msg2')
+        s._feed(protocol.FRAME_MESSAGE_BLOB, 'a["msg3"]')
+        assert s._queued == 3
+        assert s._queued_bytes == 17
+
+        s._popleft()
+        s._popleft()
+        assert s._queued == 1
+        assert s._queued_bytes == 9
+
+        s._popleft()
+        assert s._queued == 0
+        assert s._queued_bytes == 0
+
+    def test_overflow_drop_newest(self, make_manager):
+        _, sm = make_manager()
+        sm.max_queue_frames = 2
+        sm.overflow = protocol.OVERFLOW_DROP_NEWEST
+        sm.on_overflow = on_overflow = mock.Mock()
+
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        s.send('msg1')
+        s.send('msg2')
+        s.send('msg3')
+
+        assert list(s._queue) == [(protocol.FRAME_MESSAGE, ['msg1', 'msg2'])]
+        on_overflow.assert_called_with(s, protocol.FRAME_MESSAGE, 'msg3')
+
+    def test_overflow_drop_oldest(self, make_manager):
+        _, sm = make_manager()
+        sm.max_queue_bytes = 8
+        sm.overflow = protocol.OVERFLOW_DROP_OLDEST
+
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        s._feed(protocol.FRAME_OPEN, protocol.FRAME_OPEN)
+        s.send('msg1')
+        s.send_frame('a[1]')
+        s.send('msg3')
+
+        assert list(s._queue) == [
+            (protocol.FRAME_OPEN, protocol.FRAME_OPEN),
+            (protocol.FRAME_MESSAGE_BLOB, 'a[1]'),
+            (protocol.FRAME_MESSAGE, ['msg3'])]
+        assert s._queued_bytes == 8
+
+        s.send('too long message')
+        assert list(s._queue) == [(protocol.FRAME_OPEN, protocol.FRAME_OPEN)]
+
+    def test_overflow_close(self, make_manager):
+        _, sm = make_manager()
+        sm.max_queue_frames = 1
+        sm.overflow_close = (3001, 'Slow')
+
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        s.send('msg1')
+        s.send('msg2')
+
+        assert s.state == protocol.STATE_CLOSING
+        assert list(s._queue) == [(protocol.FRAME_CLOSE, (3001, 'Slow'))]
+        assert s._queued == 0
+
+    def test_overflow_callback_exc(self, make_manager):
+        _, sm = make_manager()
+        sm.max_queue_frames = 1
+        sm.overflow = protocol.OVERFLOW_DROP_NEWEST
+        sm.on_overflow = mock.Mock(side_effect=ValueError)
+
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        s.send('msg1')
+        s.send('msg2')
+        assert s._queued == 1
+
     def test_close(self, make_session):
         session = make_session('test')
         session.state = protocol.STATE_OPEN
@@ -407,6 +723,65 @@ class TestSession:
         yield from session._remote_messages(('msg1', 'msg2'))
         assert messages == []
 
+    @asyncio.coroutine
+    def test_remote_messages_batch(self, make_manager, make_handler):
+        messages = []
+        _, sm = make_manager(make_handler(messages))
+        sm.batch = True
+        session = sm.get('test', True)
+
+        yield from session._remote_messages(('msg1', 'msg2'))
+        assert messages == [
+            (protocol.SockjsMessage(protocol.MSG_MESSAGES, ['msg1', 'msg2']),
+             session)]
+
+    @asyncio.coroutine
+    def test_remote_message_batch(self, make_manager, make_handler, loop):
+        messages = []
+        _, sm = make_manager(make_handler(messages))
+        sm.batch = True
+        session = sm.get('test', True)
+
+        yield from session._remote_message('msg1')
+        yield from session._remote_message('msg2')
+        assert messages == []
+
+        yield from session._remote_close()
+        yield from session._remote_message('msg3')
+        yield from asyncio.sleep(0, loop=loop)
+        assert [msg for msg, s in messages] == [
+            protocol.SockjsMessage(protocol.MSG_MESSAGES, ['msg1', 'msg2']),
+            protocol.SockjsMessage(protocol.MSG_CLOSE, None),
+            protocol.SockjsMessage(protocol.MSG_MESSAGES, ['msg3'])]
+        assert session._inbox_task is None
+
+    @asyncio.coroutine
+    def test_remote_message_batch_limit(self, make_manager, loop):
+        batches = []
+        release = asyncio.Event(loop=loop)
+
+        @asyncio.coroutine
+        def handler(msg, session):
+            batches.append(msg.data)
+            yield from release.wait()
+
+        _, sm = make_manager(handler)
+        sm.batch = True
+        sm.max_batch = 2
+        session = sm.get('test', True)
+
+        yield from session._remote_message('msg1')
+        yield from asyncio.sleep(0, loop=loop)
+        yield from session._remote_message('msg2')
+        reading = asyncio.async(session._remote_message('msg3'), loop=loop)
+        yield from asyncio.sleep(0, loop=loop)
+        assert not reading.done()
+
+        release.set()
+        yield from reading
+        yield from asyncio.sleep(0, loop=loop)
+        assert batches == [['msg1'], ['msg2', 'msg3']]
+
 
 class TestSessionManager:
 
@@ -453,12 +828,10 @@ class TestSessionManager:
         assert isinstance(s, Session)
 
     @asyncio.coroutine
-    def test_acquire(self, make_manager, loop):
+    def test_acquire(self, mocker, make_manager, make_fut):
         s1, sm = make_manager()
         sm._add(s1)
-        s1._acquire = mock.Mock()
-        s1._acquire.return_value = asyncio.Future(loop=loop)
-        s1._acquire.return_value.set_result(1)
+        mocker.patch.object(Session, '_acquire', make_fut(1))
 
         s2 = yield from sm.acquire(s1)
 
@@ -484,10 +857,10 @@ class TestSessionManager:
             yield from sm.acquire(s)
 
     @asyncio.coroutine
-    def test_release(self, make_manager):
+    def test_release(self, mocker, make_manager):
         _, sm = make_manager()
         s = sm.get('test', True)
-        s._release = mock.Mock()
+        mocker.patch.object(Session, '_release')
 
         yield from sm.acquire(s)
         yield from sm.release(s)
@@ -519,6 +892,177 @@ class TestSessionManager:
         assert list(s1._queue) == [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')]
         assert list(s2._queue) == [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')]
 
+    def test_subscribe(self, make_manager):
+        _, sm = make_manager()
+        s1 = sm.get('test1', True)
+        s2 = sm.get('test2', True)
+
+        sm.subscribe(s1, 'room1')
+        sm.subscribe(s1, 'room2')
+        sm.subscribe(s2, 'room1')
+        assert sm.subscribers('room1') == {s1, s2}
+        assert sm.subscribers('room2') == {s1}
+        assert sm.subscribers('room3') == frozenset()
+
+    def test_unsubscribe(self, make_manager):
+        _, sm = make_manager()
+        s1 = sm.get('test1', True)
+        s2 = sm.get('test2', True)
+        sm.subscribe(s1, 'room1')
+        sm.subscribe(s1, 'room2')
+        sm.subscribe(s2, 'room1')
+
+        sm.unsubscribe(s1, 'room1')
+        sm.unsubscribe(s1, 'room3')
+        sm.unsubscribe(s2, 'room2')
+        assert sm.subscribers('room1') == {s2}
+        assert sm.subscribers('room2') == {s1}
+
+        sm.unsubscribe(s1)
+        sm.unsubscribe(s2, 'room1')
+        assert not sm._channels
+        assert not sm._subscriptions
+
+    def test_publish(self, make_manager):
+        _, sm = make_manager()
+        s1 = sm.get('test1', True)
+        s1.state = protocol.STATE_OPEN
+        s2 = sm.get('test2', True)
+        s2.state = protocol.STATE_OPEN
+        s3 = sm.get('test3', True)
+        s3.state = protocol.STATE_OPEN
+        s3.expire()
+        sm.subscribe(s1, 'room')
+        sm.subscribe(s3, 'room')
+
+        sm.publish('room', 'msg')
+        sm.publish('unknown', 'msg')
+
+        assert list(s1._queue) == [(protocol.FRAME_MESSAGE_BLOB, 'a["msg"]')]
+        assert isinstance(s1._queue[0][1], protocol.SharedFrame)
+        assert list(s2._queue) == []
+        assert list(s3._queue) == []
+
+    @asyncio.coroutine
+    def test_unsubscribe_on_close(self, make_manager):
+        _, sm = make_manager()
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        sm.subscribe(s, 'room')
+
+        yield from s._remote_closed()
+        assert sm.subscribers('room') == frozenset()
+        assert s not in sm._subscriptions
+
+    def test_resume_record(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 2
+
+        s = sm.get('test', True)
+        s.state = protocol.STATE_OPEN
+        s.send('msg1')
+        s.send_frame('a["msg2","msg3"]')
+        s.send_frame('h')
+        sm.broadcast('msg4')
+
+        assert s.seq == 4
+        assert list(s._ring) == [
+            (2, 2, protocol.FRAME_MESSAGE_BLOB, 'a["msg2","msg3"]'),
+            (4, 1, protocol.FRAME_MESSAGE_BLOB, 'a["msg4"]')]
+
+    def test_resume_drop_oldest(self, app, loop, make_handler):
+        with pytest.raises(ValueError):
+            SessionManager('sm', app, make_handler([]), loop,
+                           resume_buffer=10,
+                           overflow=protocol.OVERFLOW_DROP_OLDEST)
+
+    def test_resume(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 10
+
+        s1 = sm.get('s1', True)
+        s1.state = protocol.STATE_OPEN
+        s1.send('msg1')
+        s1.send_frame('a["msg2","msg3"]')
+        s1.send('msg4')
+
+        s2 = sm.get('s2', True)
+        s2.state = protocol.STATE_OPEN
+        assert sm.resume(s2, 's1', 2)
+
+        assert s1.state == protocol.STATE_CLOSING
+        assert list(s2._queue) == [
+            (protocol.FRAME_MESSAGE_BLOB, 'a["msg3"]'),
+            (protocol.FRAME_MESSAGE, ['msg4'])]
+        assert s2.seq == 2
+
+    def test_resume_partial_frame(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 10
+
+        s1 = sm.get('s1', True)
+        s1.state = protocol.STATE_OPEN
+        s1.send_frame('a[1,{"k":2},3]')
+
+        s2 = sm.get('s2', True)
+        s2.state = protocol.STATE_OPEN
+        assert sm.resume(s2, 's1', 1)
+        assert list(s2._queue) == [
+            (protocol.FRAME_MESSAGE_BLOB, 'a[{"k":2},3]')]
+        assert s2.seq == 2
+
+    def test_resume_unavailable(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 2
+
+        s1 = sm.get('s1', True)
+        s1.state = protocol.STATE_OPEN
+        for idx in range(3):
+            s1.send('msg%d' % idx)
+
+        s2 = sm.get('s2', True)
+        s2.state = protocol.STATE_OPEN
+        assert not sm.resume(s2, 'unknown', 0)
+        assert not s2._replay(s1.seq, 0, s1._ring)
+        assert not s2._replay(s1.seq, 4, s1._ring)
+        assert s2._replay(s1.seq, 3, s1._ring)
+        assert not s2._queue
+
+    @asyncio.coroutine
+    def test_resume_closed_session(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 10
+
+        s1 = sm.get('s1', True)
+        s1.state = protocol.STATE_OPEN
+        s1.send('msg1')
+        s1.send('msg2')
+        s1._tick(-30.0)
+
+        yield from sm._gc_task()
+        assert 's1' not in sm
+        assert 's1' in sm._retained
+
+        s2 = sm.get('s2', True)
+        s2.state = protocol.STATE_OPEN
+        assert sm.resume(s2, 's1', 1)
+        assert list(s2._queue) == [(protocol.FRAME_MESSAGE, ['msg2'])]
+        assert not sm._retained
+
+    @asyncio.coroutine
+    def test_resume_timeout(self, make_manager):
+        _, sm = make_manager()
+        sm.resume_buffer = 10
+        sm.resume_timeout = -1.0
+
+        s1 = sm.get('s1', True)
+        s1.state = protocol.STATE_OPEN
+        s1.send('msg1')
+        s1._tick(-30.0)
+
+        yield from sm._gc_task()
+        assert not sm._retained
+
     @asyncio.coroutine
     def test_clear(self, make_manager):
         _, sm = make_manager()
@@ -556,15 +1100,104 @@ class TestSessionManager:
         assert sm._hb_task is None
         assert hb_task._must_cancel
 
+    def test_heartbeat_during_gc(self, make_manager):
+        _, sm = make_manager()
+        sm._hb_task = gc_task = mock.Mock()
+
+        sm._heartbeat()
+        assert sm.started
+        assert sm._hb_task is gc_task
+        sm._hb_task = None
+        sm.stop()
+
     @asyncio.coroutine
-    def test_heartbeat_task(self, make_manager):
+    def test_gc_task(self, make_manager):
         _, sm = make_manager()
         sm._hb_task = mock.Mock()
 
-        yield from sm._heartbeat_task()
-        assert sm.started
+        yield from sm._gc_task()
+        assert not sm.started
         assert sm._hb_task is None
 
+    @asyncio.coroutine
+    def test_gc_concurrency(self, app, loop, make_session):
+        closing = []
+        running = []
+
+        @asyncio.coroutine
+        def handler(msg, session):
+            if msg.tp == protocol.MSG_CLOSE:
+                running.append(session.id)
+                closing.append(len(running))
+                yield from asyncio.sleep(0.001, loop=loop)
+                running.remove(session.id)
+
+        sm = SessionManager('sm', app, handler, loop, gc_concurrency=2)
+        for idx in range(5):
+            s = sm._add(make_session(str(idx), handler=handler))
+            s.state = protocol.STATE_OPEN
+            s._tick(-30.0)
+
+        yield from sm._gc_task()
+        assert not sm
+        assert len(closing) == 5
+        assert max(closing) == 2
+
+    @asyncio.coroutine
+    def test_heartbeat_slots(self, app, loop, make_handler, make_session):
+        sm = SessionManager('sm', app, make_handler([]), loop,
+                            heartbeat=20.0, heartbeat_slots=4)
+        assert sm._hb_interval == 5.0
+
+        s1 = sm._add(make_session('s1'))
+        s2 = sm._add(make_session('s2'))
+        yield from sm.acquire(s1)
+        sm._heartbeat()
+        yield from sm.acquire(s2)
+        sm.stop()
+
+        assert s1._hb_slot is sm._hb_slots[3]
+        assert s2._hb_slot is sm._hb_slots[0]
+
+        for _ in range(3):
+            sm._heartbeat()
+            sm.stop()
+        assert s1._heartbeats == 1
+        assert s2._heartbeats == 0
+
+        sm._heartbeat()
+        sm.stop()
+        assert s1._heartbeats == 1
+        assert s2._heartbeats == 1
+
+        yield from sm.release(s2)
+        assert s2._hb_slot is None
+        assert not sm._hb_slots[0]
+
+    @asyncio.coroutine
+    def test_heartbeat_idle_session(self, app, loop, make_handler,
+                                    make_session):
+        sm = SessionManager('sm', app, make_handler([]), loop,
+                            heartbeat=20.0, heartbeat_slots=4)
+        s = sm._add(make_session('s1'))
+        yield from sm.acquire(s)
+
+        # coarse clock lags behind loop time by a varying amount
+        times = [100.0 + tick * 5.0 - (0.1 if tick % 2 else 0.0)
+                 for tick in range(16)]
+        s._queue = ()
+        frames = []
+        with mock.patch.object(s._clock, 'time', side_effect=times * 2):
+            for _ in times:
+                sm._heartbeat()
+                sm.stop()
+                frames.extend(s._queue)
+                s._queue = ()
+
+        # idle session gets heartbeat on every tick of its slot
+        assert frames == [(protocol.FRAME_HEARTBEAT,
+                           protocol.FRAME_HEARTBEAT)] * 4
+
     @asyncio.coroutine
     def test_gc_expire(self, make_manager):
         s, sm = make_manager()
@@ -573,9 +1206,9 @@ class TestSessionManager:
         yield from sm.acquire(s)
         yield from sm.release(s)
 
-        s.expires = datetime.now() - timedelta(seconds=30)
+        s._tick(-30.0)
 
-        yield from sm._heartbeat_task()
+        yield from sm._gc_task()
         assert s.id not in sm
         assert s.expired
         assert s.state == protocol.STATE_CLOSED
@@ -590,9 +1223,9 @@ class TestSessionManager:
         sm._add(s)
         yield from sm.acquire(s)
 
-        s.expires = datetime.now() - timedelta(seconds=30)
+        s._tick(-30.0)
 
-        yield from sm._heartbeat_task()
+        yield from sm._gc_task()
         assert s.id in sm
         assert s.id in sm.acquired
         assert not s.expired
@@ -600,13 +1233,46 @@ class TestSessionManager:
 
         # Simulating the releasing of the session due to an error
         yield from sm.release(s)
-        s.expires = datetime.now() - timedelta(seconds=30)
-        yield from sm._heartbeat_task()
+        s._tick(-30.0)
+        yield from sm._gc_task()
         assert s.id not in sm
         assert s.id not in sm.acquired
         assert s.expired
         assert s.state == protocol.STATE_CLOSED
 
+    @asyncio.coroutine
+    def test_gc_skips_acquired(self, make_manager):
+        s, sm = make_manager()
+        sm._add(s)
+        yield from sm.acquire(s)
+        assert s._bucket is None
+        assert len(sm._expiry) == 0
+
+        # idle acquired session is not popped by every pass
+        s._tick(-30.0)
+        assert s._bucket is None
+        with mock.patch.object(sm._expiry, 'touch') as touch:
+            yield from sm._gc_task()
+        assert not touch.called
+
+        # released session is indexed with fresh deadline
+        yield from sm.release(s)
+        assert s._bucket is not None
+        assert s.expires > s._clock.time()
+
+    @asyncio.coroutine
+    def test_release_closed(self, make_manager):
+        s, sm = make_manager()
+        sm._add(s)
+        yield from sm.acquire(s)
+        yield from s._remote_closed()
+        assert s.expired
+
+        yield from sm.release(s)
+        assert s.expired
+        assert s._bucket is not None
+        assert s not in list(sm.active_sessions())
+
     @asyncio.coroutine
     def test_gc_one_expire(self, make_manager, make_session):
         _, sm = make_manager()
@@ -620,8 +1286,27 @@ class TestSessionManager:
         yield from sm.release(s1)
         yield from sm.release(s2)
 
-        s1.expires = datetime.now() - timedelta(seconds=30)
+        s1._tick(-30.0)
+
+        yield from sm._gc_task()
+        assert s1.id not in sm
+        assert s2.id in sm
+
+    @asyncio.coroutine
+    def test_gc_touched_while_closing(self, make_manager, make_session):
+        _, sm = make_manager()
+        s1 = make_session('id1')
+        s2 = make_session('id2')
+        sm._add(s1)
+        sm._add(s2)
+        s1._tick(-30.0)
+        s2._tick(-30.0)
+
+        s2._tick()
 
-        yield from sm._heartbeat_task()
+        with mock.patch.object(
+                sm._expiry, 'expired', return_value=[s1, s2]):
+            yield from sm._gc_task()
         assert s1.id not in sm
         assert s2.id in sm
+        assert s2._bucket is not None
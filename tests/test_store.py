@@ -0,0 +1,139 @@
+import asyncio
+from unittest import mock
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_coro
+from multidict import CIMultiDict
+
+import sockjs
+from sockjs import SessionIsRemote, SessionManager
+from sockjs.store import FORWARDED, FORWARDED_FOR
+from sockjs.store import SessionStore, UnixSocketStore, owner_of
+
+
+def server_of(owner, workers):
+    for idx in range(1000):
+        server = '%03d' % idx
+        if owner_of(server, workers) == owner:
+            return server
+
+
+def make_store_request(make_request, server, transport='xhr', headers=()):
+    request = make_request('POST', '/sm/', headers=CIMultiDict(headers))
+    request.match_info.update(
+        {'server': server, 'session': 's1', 'transport': transport})
+    return request
+
+
+def test_owner_of():
+    owners = {owner_of('%03d' % idx, 4) for idx in range(1000)}
+    assert owners == {0, 1, 2, 3}
+    assert owner_of('123', 4) == owner_of('123', 4)
+
+
+def test_worker_out_of_range():
+    with pytest.raises(ValueError):
+        UnixSocketStore('/tmp/w{}.sock', 2, 2)
+
+
+def test_owner(make_request):
+    store = UnixSocketStore('/tmp/w{}.sock', 0, 2)
+    local, remote = server_of(0, 2), server_of(1, 2)
+
+    assert store.owner(make_store_request(make_request, local)) is None
+    assert store.owner(make_store_request(make_request, remote)) == 1
+    assert store.owner(make_store_request(
+        make_request, remote, 'websocket')) is None
+    assert store.owner(make_store_request(
+        make_request, remote, headers={FORWARDED: '1'})) is None
+    assert SessionStore().owner(
+        make_store_request(make_request, remote)) is None
+
+
+def test_get_remote(app, loop, make_handler, make_request):
+    store = UnixSocketStore('/tmp/w{}.sock', 0, 2)
+    sm = SessionManager('sm', app, make_handler([]), loop, store=store)
+
+    request = make_store_request(make_request, server_of(1, 2))
+    with pytest.raises(SessionIsRemote) as exc:
+        sm.get('s1', True, request=request)
+    assert exc.value.owner == 1
+    assert 's1' not in sm
+
+    request = make_store_request(make_request, server_of(0, 2))
+    assert sm.get('s1', True, request=request) is sm['s1']
+
+
+@asyncio.coroutine
+def test_handler_forwards(make_route, make_request, make_fut):
+    route = make_route()
+    store = route.manager.store = mock.Mock()
+    store.owner.return_value = 1
+    store.forward = make_fut(web.Response(text='forwarded'))
+
+    request = make_store_request(make_request, '000')
+    response = yield from route.handler(request)
+    assert response.text == 'forwarded'
+    store.forward.assert_called_with(request, 1)
+    assert 's1' not in route.manager
+
+
+@asyncio.coroutine
+def test_forward_headers(make_request):
+    store = UnixSocketStore('/tmp/w{}.sock', 0, 2)
+    request = make_store_request(
+        make_request, server_of(1, 2), headers={FORWARDED_FOR: 'spoofed'})
+    request.transport.get_extra_info = mock.Mock(
+        return_value=('10.0.0.1', 4000))
+    request.read = make_mocked_coro(b'')
+    client = store._client = mock.Mock()
+    client.return_value.request = make_mocked_coro(
+        raise_exception=aiohttp.ClientError())
+
+    response = yield from store.forward(request, 1)
+    assert response.status == 502
+    headers = client.return_value.request.call_args[1]['headers']
+    assert headers[FORWARDED] == '0'
+    assert headers[FORWARDED_FOR] == '10.0.0.1'
+
+
+@asyncio.coroutine
+def test_unix_socket_store(loop, make_handler, tmpdir):
+    path = str(tmpdir.join('worker-{}.sock'))
+    apps, results = [], []
+    for worker in range(2):
+        app = web.Application(loop=loop)
+        result = []
+        sockjs.add_endpoint(
+            app, make_handler(result), name='sm', prefix='/sm',
+            store=UnixSocketStore(path, worker, 2, loop=loop))
+        yield from app.startup()
+        apps.append(app)
+        results.append(result)
+
+    server = server_of(0, 2)
+    url = 'http://localhost/sm/%s/s1/' % server
+    client = aiohttp.ClientSession(
+        connector=aiohttp.UnixConnector(path.format(1), loop=loop),
+        loop=loop)
+
+    resp = yield from client.post(url + 'xhr')
+    assert (yield from resp.text()) == 'o\n'
+    assert 'Set-Cookie' in resp.headers
+
+    resp = yield from client.post(url + 'xhr_send', data='["msg"]')
+    assert resp.status == 204
+    yield from resp.release()
+
+    manager0 = sockjs.get_manager('sm', apps[0])
+    manager1 = sockjs.get_manager('sm', apps[1])
+    assert 's1' in manager0
+    assert 's1' not in manager1
+    assert [msg.data for msg, s in results[0]] == [None, 'msg']
+
+    client.close()
+    for app in apps:
+        yield from app.cleanup()
+        sockjs.get_manager('sm', app).stop()
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+from sockjs import SessionManager, protocol
+from sockjs.metrics import format_metrics
+from sockjs.threadpool import ThreadPoolHandler, ThreadSession
+
+
+@asyncio.coroutine
+def test_thread_session(make_session, loop):
+    session = make_session('test')
+    session.state = protocol.STATE_OPEN
+    proxy = ThreadSession(session, loop)
+
+    def run():
+        proxy.send('msg1')
+        proxy.send_frame('a["msg2"]')
+        proxy.close(3001, 'Bye')
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert not session._queue
+    assert proxy.id == 'test'
+
+    yield from asyncio.sleep(0, loop=loop)
+    assert list(session._queue) == [
+        (protocol.FRAME_MESSAGE, ['msg1']),
+        (protocol.FRAME_MESSAGE_BLOB, 'a["msg2"]'),
+        (protocol.FRAME_CLOSE, (3001, 'Bye'))]
+
+
+@asyncio.coroutine
+def test_handler_in_thread(make_session, loop):
+    threads = []
+
+    def handler(msg, session):
+        threads.append(threading.current_thread())
+        session.send(msg)
+
+    session = make_session('test')
+    session.state = protocol.STATE_OPEN
+    pool = ThreadPoolHandler(handler, 2, loop=loop)
+
+    yield from pool('msg', session)
+    assert threads[0] is not threading.current_thread()
+    assert list(session._queue) == [(protocol.FRAME_MESSAGE, ['msg'])]
+    assert not pool._sessions
+    pool.shutdown()
+
+
+@asyncio.coroutine
+def test_session_order(make_session, loop):
+    calls = []
+
+    def handler(msg, session):
+        if msg == 'slow':
+            time.sleep(0.05)
+        calls.append((msg, session.id))
+
+    s1 = make_session('s1')
+    s2 = make_session('s2')
+    pool = ThreadPoolHandler(handler, 4, loop=loop)
+
+    # gather() does not start calls in argument order
+    tasks = [asyncio.async(pool(msg, s), loop=loop)
+             for msg, s in (('slow', s1), ('fast', s1), ('other', s2))]
+    yield from asyncio.wait(tasks, loop=loop)
+    assert calls == [('other', 's2'), ('slow', 's1'), ('fast', 's1')]
+    pool.shutdown()
+
+
+@asyncio.coroutine
+def test_stats(make_session, loop):
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(msg, session):
+        started.set()
+        release.wait(1)
+
+    pool = ThreadPoolHandler(handler, 1, loop=loop)
+    calls = asyncio.gather(
+        pool('msg', make_session('s1')), pool('msg', make_session('s2')),
+        loop=loop)
+    yield from asyncio.sleep(0, loop=loop)
+    yield from loop.run_in_executor(None, started.wait, 1)
+
+    stats = pool.stats()
+    assert stats['active'] == 1
+    assert stats['queued'] == 1
+    assert stats['saturation'] == 1.0
+
+    release.set()
+    yield from calls
+    stats = pool.stats()
+    assert stats['active'] == 0
+    assert stats['completed'] == 2
+    assert stats['max_active'] == 1
+    pool.shutdown()
+
+
+@asyncio.coroutine
+def test_thread_manager(app, loop, make_handler):
+    seen = set()
+
+    def handler(msg, session):
+        seen.add(session)
+        session.manager.subscribe(session, 'room')
+        session.manager.publish('room', 'hello')
+        seen.add(session.manager.subscribers('room'))
+
+    sm = SessionManager('sm', app, make_handler([]), loop)
+    s1 = sm.get('s1', True)
+    s1.state = protocol.STATE_OPEN
+    pool = ThreadPoolHandler(handler, 2, loop=loop)
+
+    yield from pool(protocol.OpenMessage, s1)
+    yield from pool(protocol.OpenMessage, s1)
+    # same proxy for both calls
+    proxy, subscribers = sorted(seen, key=lambda o: type(o).__name__)
+    assert isinstance(proxy, ThreadSession)
+    assert subscribers == {s1}
+    assert sm.subscribers('room') == {s1}
+    assert list(s1._queue) == [
+        (protocol.FRAME_MESSAGE_BLOB, 'a["hello"]')] * 2
+
+    # proxy is dropped with closed session
+    yield from pool(protocol.ClosedMessage, s1)
+    assert not pool._proxies
+    pool.shutdown()
+
+
+def test_threadpool_metrics(app, loop):
+    pool = ThreadPoolHandler(lambda msg, session: None, 4, loop=loop)
+    sm = SessionManager('sm', app, pool, loop, metrics=True)
+    lines = format_metrics(sm.metrics.collect(sm)).splitlines()
+    assert 'sockjs_threadpool_workers{endpoint="sm"} 4' in lines
+    assert 'sockjs_threadpool_saturation{endpoint="sm"} 0.0' in lines
+    pool.shutdown()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from unittest import mock
+
+from sockjs import SessionManager, protocol
+from sockjs.tracing import LoggingTracer, Tracer
+
+
+class RecordingTracer(Tracer):
+
+    def __init__(self):
+        self.events = []
+
+    def on_open(self, session):
+        self.events.append(('open', session.id))
+
+    def on_message_in(self, session, msg):
+        self.events.append(('in', msg))
+
+    def on_frame_out(self, session, frame, data):
+        self.events.append(('out', frame, data))
+
+    def on_close(self, session):
+        self.events.append(('close', session.id))
+
+
+@asyncio.coroutine
+def test_tracer_hooks(app, loop, make_handler):
+    tracer = RecordingTracer()
+    sm = SessionManager('sm', app, make_handler([]), loop, tracer=tracer)
+    s = sm.get('test', True)
+
+    yield from sm.acquire(s)
+    yield from s._remote_message('msg1')
+    yield from s._remote_messages(['msg2'])
+    s.send('msg3')
+    yield from s._remote_closed()
+
+    assert tracer.events == [
+        ('open', 'test'),
+        ('out', protocol.FRAME_OPEN, protocol.FRAME_OPEN),
+        ('in', 'msg1'),
+        ('in', 'msg2'),
+        ('out', protocol.FRAME_MESSAGE, 'msg3'),
+        ('close', 'test')]
+
+
+def test_no_tracer(app, loop, make_handler, make_session):
+    sm = SessionManager('sm', app, make_handler([]), loop)
+    assert sm.tracer is None
+    assert sm.get('test', True)._tracer is None
+
+    s = sm._add(make_session('debug'))
+    assert s._tracer is None
+
+
+def test_debug_tracer(app, loop, make_handler):
+    sm = SessionManager('sm', app, make_handler([]), loop, debug=True)
+    assert isinstance(sm.tracer, LoggingTracer)
+    assert sm.get('test', True)._tracer is sm.tracer
+
+
+def test_logging_tracer(make_session):
+    logger = mock.Mock()
+    tracer = LoggingTracer(logger, logging.INFO, limit=3)
+    s = make_session('test')
+
+    tracer.on_message_in(s, 'message')
+    logger.log.assert_called_with(
+        logging.INFO, 'incoming message: %s, %s', 'test', 'mes')
+
+    tracer.on_frame_out(s, protocol.FRAME_CLOSE, (3000, 'Go away!'))
+    logger.log.assert_called_with(
+        logging.INFO, 'outgoing frame: %s, %s, %s',
+        'test', protocol.FRAME_CLOSE, '(30')
@@ -1,11 +1,21 @@
 import asyncio
+import socket
 from unittest import mock
 from aiohttp import web
+from aiohttp.test_utils import make_mocked_coro
 
 import pytest
 
 from sockjs import protocol
-from sockjs.transports import base
+from sockjs.exceptions import SlowConsumer
+from sockjs.metrics import Metrics
+from sockjs.transports import htmlfile, eventsource
+from sockjs.transports import base, utils
+
+try:
+    from asyncio import ensure_future
+except ImportError:  # pragma: no cover
+    ensure_future = asyncio.async
 
 
 @pytest.fixture
@@ -46,6 +56,60 @@ def test_streaming_send(make_transport):
     assert stop
 
 
+def test_streaming_send_shared_frame(make_request):
+    frame = protocol.SharedFrame('a["msg"]')
+    request = make_request('GET', '/')
+    sent = {}
+
+    for cls in (base.StreamingTransport,
+                eventsource.EventsourceTransport,
+                htmlfile.HTMLFileTransport):
+        for idx in range(2):
+            trans = cls(mock.Mock(), mock.Mock(), request)
+            trans.response = mock.Mock()
+            trans.send(frame)
+            sent.setdefault(cls, []).append(
+                trans.response.write.call_args[0][0])
+
+    for first, second in sent.values():
+        assert first is second
+    assert sorted(frame.encoded) == ['eventsource', 'htmlfile', 'json', 'line']
+
+
+def test_send_queued(make_transport, make_session):
+    trans = make_transport()
+    trans.session = session = make_session('test')
+    session.state = protocol.STATE_OPEN
+    session.send('msg1')
+    session._heartbeat_transport = True
+    session._heartbeat()
+    session.send('msg2')
+    session.close()
+
+    resp = trans.response = mock.Mock()
+    stop = trans.send_queued(session._take()[1])
+    assert not stop
+    assert resp.write.call_count == 1
+    resp.write.assert_called_with(b'a["msg1"]\nh\na["msg2"]\n')
+    assert list(session._queue) == [
+        (protocol.FRAME_CLOSE, (3000, 'Go away!'))]
+
+
+def test_send_queued_maxsize(make_transport, make_session):
+    trans = make_transport()
+    trans.session = session = make_session('test')
+    session._heartbeat_transport = True
+    session._heartbeat()
+    session._heartbeat()
+    session._heartbeat()
+
+    trans.maxsize = 3
+    resp = trans.response = mock.Mock()
+    assert trans.send_queued('o')
+    resp.write.assert_called_with(b'o\nh\n')
+    assert len(session._queue) == 2
+
+
 @asyncio.coroutine
 def test_handle_session_interrupted(make_transport, make_fut):
     trans = make_transport()
@@ -80,3 +144,105 @@ def test_handle_session_closed(make_transport, make_fut):
     yield from trans.handle_session()
     trans.session._remote_closed.assert_called_with()
     trans.send.assert_called_with('c[3000,"Go away!"]')
+
+
+@asyncio.coroutine
+def test_drain(make_transport, make_fut):
+    trans = make_transport()
+    trans.request.transport.get_write_buffer_size = mock.Mock(return_value=0)
+    trans.response = mock.Mock()
+    assert (yield from trans.drain())
+    assert not trans.response.drain.called
+
+    trans.request.transport.get_write_buffer_size.return_value = 100000
+    trans.response.drain = make_fut(None)
+    assert (yield from trans.drain())
+    assert trans.response.drain.called
+
+
+@asyncio.coroutine
+def test_drain_timeout(make_transport, loop):
+    trans = make_transport()
+    trans.drain_timeout = 0.001
+    trans.request.transport.get_write_buffer_size = mock.Mock(
+        return_value=100000)
+    trans.response = mock.Mock()
+    trans.response.drain.return_value = asyncio.Future(loop=loop)
+    assert not (yield from trans.drain())
+
+
+@asyncio.coroutine
+def test_handle_session_slow_consumer(make_transport, make_fut):
+    trans = make_transport()
+    trans.manager.acquire = make_fut(None)
+    trans.manager.release = make_fut(None)
+    trans.manager.streams = {}
+    trans.manager.metrics = Metrics()
+    trans.session.interrupted = False
+    trans.session.state = protocol.STATE_OPEN
+    frames = [(protocol.FRAME_MESSAGE, 'a["msg"]')]
+    trans.session._queue = frames
+    trans.session._take = lambda: frames.pop(0)
+    trans.session._remote_close = make_fut(None)
+    trans.request.transport.get_write_buffer_size.return_value = (
+        trans.high_water + 1)
+    trans.response = mock.Mock()
+    trans.drain = make_fut(False)
+
+    yield from trans.handle_session()
+    trans.request.transport.set_write_buffer_limits.assert_called_with(
+        high=trans.high_water, low=trans.low_water)
+    exc = trans.session._remote_close.call_args[1]['exc']
+    assert isinstance(exc, SlowConsumer)
+    assert trans.session._remote_closed.called
+    assert trans.request.transport.abort.called
+    assert trans.manager.metrics.slow_consumers == 1
+    assert trans.manager.streams == {}
+    assert trans.session._sink is None
+
+
+@asyncio.coroutine
+def test_handle_session_flush(make_transport, loop):
+    trans = make_transport()
+    trans.manager.acquire = make_mocked_coro()
+    trans.manager.release = make_mocked_coro()
+    trans.manager.streams = {}
+    trans.session.interrupted = False
+    trans.session.state = protocol.STATE_OPEN
+    trans.session._queue = frames = []
+    trans.session._take = lambda: frames.pop(0)
+    trans.request.transport.get_write_buffer_size.return_value = 0
+    trans.response = mock.Mock()
+
+    task = ensure_future(trans.handle_session(), loop=loop)
+    yield from asyncio.sleep(0, loop=loop)
+    assert trans.session._sink is trans
+    assert trans.manager.streams == {trans.session.id: trans}
+
+    # manager flushes queued frames
+    frames.append((protocol.FRAME_MESSAGE, 'a["msg"]'))
+    frames.append((protocol.FRAME_CLOSE, 'c[3000,"Go away!"]'))
+    trans.flush(trans.session)
+    yield from task
+    assert trans.response.write.call_args_list == [
+        mock.call(b'a["msg"]\n'), mock.call(b'c[3000,"Go away!"]\n')]
+    assert trans.session._remote_closed.called
+    assert trans.session._sink is None
+    assert trans.manager.release.called
+
+
+def test_write_buffers():
+    sock, peer = socket.socketpair()
+    try:
+        transport = mock.Mock()
+        transport.get_write_buffer_size.return_value = 10
+        transport.get_extra_info.return_value = sock
+        sock.send(b'data')
+
+        userland, kernel = utils.write_buffers(transport)
+        assert userland == 10
+        if utils.TIOCOUTQ is not None:
+            assert kernel >= 0
+    finally:
+        sock.close()
+        peer.close()
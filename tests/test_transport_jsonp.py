@@ -27,6 +27,9 @@ def test_streaming_send(make_transport):
     resp.write.assert_called_with(b'/**/cb("text data");\r\n')
     assert stop
 
+    assert trans.send_queued('text data')
+    assert resp.write.call_count == 2
+
 
 @asyncio.coroutine
 def test_process(make_transport, make_fut):
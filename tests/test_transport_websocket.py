@@ -6,6 +6,8 @@ import pytest
 
 from aiohttp.test_utils import make_mocked_coro
 
+from sockjs.protocol import FRAME_CLOSE, FRAME_MESSAGE
+from sockjs.protocol import STATE_CLOSED, STATE_OPEN
 from sockjs.transports import WebSocketTransport
 
 
@@ -15,6 +17,7 @@ def make_transport(make_request, make_fut):
         manager = mock.Mock()
         session = mock.Mock()
         session._remote_closed = make_fut(1)
+        session._queue = ()
         request = make_request(method, path, query_params=query_params)
         return WebSocketTransport(manager, session, request)
 
@@ -35,3 +38,116 @@ def test_process_release_acquire_and_remote_closed(make_transport):
     transp.session._remote_closed.assert_called_once_with()
     assert transp.manager.acquire.called
     assert transp.manager.release.called
+
+
+def test_write_direct(make_transport):
+    transp = make_transport()
+    transp.ws = mock.Mock()
+    transp.ws.closed = False
+    transport = transp.request.transport
+    transport.get_write_buffer_size = mock.Mock(return_value=0)
+
+    assert transp.write_direct('a["msg"]')
+    transp.ws.send_str.assert_called_with('a["msg"]')
+
+    transport.get_write_buffer_size.return_value = transp.high_water + 1
+    assert not transp.write_direct('a["msg"]')
+
+    transport.get_write_buffer_size.return_value = 0
+    transp.ws.closed = True
+    assert not transp.write_direct('a["msg"]')
+    assert transp.ws.send_str.call_count == 1
+
+
+@asyncio.coroutine
+def test_process_sink(make_transport):
+    transp = make_transport()
+    transp.session.interrupted = False
+    sinks = []
+
+    @asyncio.coroutine
+    def acquire(session):
+        return session
+
+    @asyncio.coroutine
+    def client(ws, session):
+        sinks.append(session._sink)
+
+    transp.manager.acquire = acquire
+    transp.manager.release = make_mocked_coro()
+    transp.manager.flush_delay = None
+    transp.client = client
+
+    yield from transp.process()
+    assert sinks == [transp]
+    assert transp.session._sink is None
+    assert transp.direct
+    assert transp.manager.release.called
+
+
+@asyncio.coroutine
+def test_process_flush_delay(make_transport):
+    transp = make_transport()
+    transp.session.interrupted = False
+    transp.manager.acquire = make_mocked_coro()
+    transp.manager.release = make_mocked_coro()
+    transp.manager.flush_delay = 0.01
+    transp.client = make_mocked_coro()
+
+    yield from transp.process()
+    assert not transp.direct
+
+
+def test_flush(make_transport, loop):
+    transp = make_transport()
+    transp.ws = mock.Mock(closed=False)
+    transp.done = asyncio.Future(loop=loop)
+    session = transp.session
+    session.state = STATE_OPEN
+    session._sink = transp
+    frames = [(FRAME_MESSAGE, 'a["msg"]'), (FRAME_CLOSE, 'c[3000,"Go away!"]')]
+    session._queue = frames
+    session._take = lambda: frames.pop(0)
+
+    transp.flush(session)
+    assert transp.ws.send_str.call_args_list == [
+        mock.call('a["msg"]'), mock.call('c[3000,"Go away!"]')]
+    assert session._sink is None
+    assert transp.done.result()
+
+    # nothing is written after done
+    frames.append((FRAME_MESSAGE, 'a["msg"]'))
+    transp.flush(session)
+    assert transp.ws.send_str.call_count == 2
+
+
+@asyncio.coroutine
+def test_process_close_frame(make_transport):
+    transp = make_transport()
+    transp.session.interrupted = False
+    transp.session.state = STATE_OPEN
+    frames = [(FRAME_CLOSE, 'c[3000,"Go away!"]')]
+    transp.session._queue = frames
+    transp.session._take = lambda: frames.pop(0)
+    transp.manager.acquire = make_mocked_coro()
+    transp.manager.release = make_mocked_coro()
+    transp.manager.flush_delay = None
+
+    @asyncio.coroutine
+    def client(ws, session):
+        yield from asyncio.sleep(10)
+
+    transp.client = client
+    ws = yield from transp.process()
+    assert ws.closed
+    transp.session._remote_closed.assert_called_once_with()
+    assert transp.manager.release.called
+
+
+def test_flush_closed_session(make_transport, loop):
+    transp = make_transport()
+    transp.ws = mock.Mock(closed=False)
+    transp.done = asyncio.Future(loop=loop)
+    transp.session.state = STATE_CLOSED
+    transp.flush(transp.session)
+    assert transp.done.result() is False